@@ -7,10 +7,12 @@ class DetailsGraphState(TypedDict):
     last_intent:str
     sufficient_details:str
     document_summary:str
+    local_intent_checked:str
 
 class GenGraphState(TypedDict):
     last_user_message:str
     effective_chat_history:List[BaseMessage]
     document_summary:str
     within_token_limit:str
-    tool_invoke:List[ToolMessage]
\ No newline at end of file
+    tool_invoke:List[ToolMessage]
+    answer_cached:str
\ No newline at end of file
@@ -1,8 +1,9 @@
 from langgraph.graph import StateGraph, START, END
+from config import DETAILS_GRAPH_MODE
 from ..graph_states import DetailsGraphState
 from ..node_functions import details_functions
 
-def build_details_graph():
+def build_details_graph(mode: str = DETAILS_GRAPH_MODE):
     graph_builder = StateGraph(DetailsGraphState)
 
     graph_builder.add_node("check intent", details_functions.classify_message_intent)
@@ -10,7 +11,22 @@ def build_details_graph():
     graph_builder.add_node("need details", details_functions.get_more_details)
     graph_builder.add_node("divert back", details_functions.divert_to_policy)
 
-    graph_builder.add_edge(START, "check intent")
+    if mode == "fused":
+        # one LLM call for intent and details, sequential nodes only run if it cannot be parsed
+        graph_builder.add_node("check intent and details", details_functions.classify_and_check_details)
+        graph_builder.add_edge(START, "check intent and details")
+        graph_builder.add_conditional_edges(
+            "check intent and details",
+            details_functions.fused_conditional,
+            {
+                "fallback":"check intent",
+                "divert":"divert back",
+                "end": END
+            }
+        )
+    else:
+        graph_builder.add_edge(START, "check intent")
+
     graph_builder.add_conditional_edges(
         "check intent",
         details_functions.intent_conditional,
@@ -30,4 +46,4 @@ def build_details_graph():
 
     return graph
 
-details_graph = build_details_graph()
\ No newline at end of file
+details_graph = build_details_graph()
@@ -6,11 +6,13 @@ def build_gen_graph():
     graph_builder = StateGraph(GenGraphState)
 
     graph_builder.add_node("decide retrieval", gen_functions.decide_retrieve)
+    graph_builder.add_node("check answer cache", gen_functions.check_answer_cache)
     graph_builder.add_node("retrieve documents", gen_functions.retrieve_policy)
     graph_builder.add_node("summarise documents", gen_functions.document_summary)
     graph_builder.add_node("check context length", gen_functions.check_context_length)
     graph_builder.add_node("truncate history", gen_functions.truncate_chat_history)
     graph_builder.add_node("generate answer", gen_functions.answer_user_query)
+    graph_builder.add_node("cache answer", gen_functions.cache_answer)
 
     graph_builder.add_edge(START, "decide retrieval")
 
@@ -18,11 +20,20 @@ def build_gen_graph():
         "decide retrieval",
         gen_functions.need_retrieve,
         {
-            True:"retrieve documents",
+            True:"check answer cache",
             False:"check context length"
         }
     )
 
+    graph_builder.add_conditional_edges(
+        "check answer cache",
+        gen_functions.answer_cache_conditional,
+        {
+            "hit": END,
+            "miss":"retrieve documents"
+        }
+    )
+
     graph_builder.add_edge("retrieve documents", "summarise documents")
     graph_builder.add_edge("summarise documents", "check context length")
 
@@ -35,8 +46,10 @@ def build_gen_graph():
         }
     )
 
-    graph_builder.add_edge("truncate history", "check context length")
-    graph_builder.add_edge("generate answer", END)
+    # trimming fits the budgets in one pass
+    graph_builder.add_edge("truncate history", "generate answer")
+    graph_builder.add_edge("generate answer", "cache answer")
+    graph_builder.add_edge("cache answer", END)
 
     graph = graph_builder.compile()
 
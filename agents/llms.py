@@ -1,19 +1,26 @@
 import os
 from dotenv import load_dotenv
 from langchain_groq import ChatGroq
+from config import LLM_CACHE_ENABLED
+from utils.llm_cache import llm_cache
 from .node_functions.tool_functions import tools
 
 load_dotenv() 
 
+# identical prompts are answered from the cache, keyed on model, bound tools and messages
+cache = llm_cache if LLM_CACHE_ENABLED else None
+
 # defining the LLM used
 llm = ChatGroq(
     model="llama-3.1-8b-instant", # llama3-8b-8192
-    temperature=0
+    temperature=0,
+    cache=cache
 )
 
 llm2 = ChatGroq(
     model="llama-3.1-8b-instant", # llama3-8b-8192
-    temperature=0
+    temperature=0,
+    cache=cache
 )
 
-llm2 = llm2.bind_tools(tools)
+llm2 = llm2.bind_tools(tools)
\ No newline at end of file
@@ -1,5 +1,8 @@
 import re
+from config import INTENT_CLASSIFIER_ENABLED
 from logger import get_logger
+from models import IntentEnum
+from utils.intent_classifier import intent_classifier
 from ..graph_states import DetailsGraphState
 from ..llms import llm
 from langchain_core.messages import BaseMessage, ToolMessage, HumanMessage, AIMessage
@@ -9,9 +12,13 @@ from langchain_huggingface import HuggingFaceEmbeddings
 
 logger = get_logger(__name__)
 
+# reply to small talk the local classifier is confident about, instead of generating one
+DIVERT_REPLY = "I can only help with questions about company policies. Is there a policy you would like to know about?"
+
 def classify_message_intent(state: DetailsGraphState) -> DetailsGraphState:
     '''
-    Prompt to classify intent of last user message in relation to effective chat history into 1 of 3 classes
+    Prompt to classify intent of last user message in relation to effective chat history into 1 of 3 classes.
+    The local classifier is skipped when the fused node already ran it for this message.
     '''
     logger.debug("-------- Entering intent node --------")
 
@@ -20,6 +27,15 @@ def classify_message_intent(state: DetailsGraphState) -> DetailsGraphState:
         logger.debug("-------- User exit of intent node --------")
         return state
 
+    if INTENT_CLASSIFIER_ENABLED and state.get('local_intent_checked') != "Yes":
+        local_intent = intent_classifier.classify(state['last_user_message'], state['effective_chat_history'])
+        intent_classifier.record(llm_call_skipped=local_intent is not None)
+        if local_intent is not None:
+            state['last_intent'] = local_intent
+            logger.info(f"result: {local_intent} classified locally, added to last intent state")
+            logger.debug("-------- Local exit of intent node --------")
+            return state
+
     system = '''
         <|begin_of_text|><|start_header_id|>system<|end_header_id|>
         You are a helpful assistant supporting a company policy query bot. 
@@ -184,6 +200,144 @@ def get_more_details(state: DetailsGraphState) -> DetailsGraphState:
     logger.debug("-------- Normal exit of get more details node --------")
     return state
 
+def classify_and_check_details(state: DetailsGraphState) -> DetailsGraphState:
+    '''
+    Single prompt that classifies intent of last user message and checks whether there are enough details
+    for policy retrieval, replacing the intent -> context removal -> details/divert round trips.
+    When the local classifier is confident, small talk gets DIVERT_REPLY without any LLM call, and
+    policy messages only go through the shorter details check of get_more_details.
+    Leaves last_intent as 'None' when the response cannot be parsed so the sequential nodes take over.
+    '''
+    logger.debug("-------- Entering fused intent and details node --------")
+
+    if state['last_user_message'] == "exit":
+        state['last_intent'] = "end"
+        logger.debug("-------- User exit of fused intent and details node --------")
+        return state
+
+    if INTENT_CLASSIFIER_ENABLED:
+        local_intent = intent_classifier.classify(state['last_user_message'], state['effective_chat_history'])
+        # only small talk skips the LLM, policy messages still need the details check
+        intent_classifier.record(llm_call_skipped=local_intent == IntentEnum.NON_POLICY_RELATED.value)
+        # the sequential fallback only runs when the classifier was unsure, it must not classify again
+        state['local_intent_checked'] = "Yes"
+        if local_intent == IntentEnum.NON_POLICY_RELATED.value:
+            state['last_intent'] = local_intent
+            state['effective_chat_history'].append(HumanMessage(content=state['last_user_message']))
+            state['effective_chat_history'].append(AIMessage(content=DIVERT_REPLY))
+            state['sufficient_details'] = "No"
+            logger.info(f"result: {local_intent} classified locally, diverted without LLM call")
+            logger.debug("-------- Local exit of fused intent and details node --------")
+            return state
+        if local_intent is not None:
+            # intent is known, only ask the LLM whether there are enough details
+            state['last_intent'] = local_intent
+            logger.info(f"result: {local_intent} classified locally, checking details only")
+            if local_intent == IntentEnum.DIFFERENT_POLICY.value:
+                state = effective_context_removal(state)
+            state = get_more_details(state)
+            logger.debug("-------- Local exit of fused intent and details node --------")
+            return state
+
+    system = '''
+        <|begin_of_text|><|start_header_id|>system<|end_header_id|>
+        You are a helpful assistant supporting a company policy query bot.
+        Carefully read the entire chat history and the user's most recent message before making your decision.
+
+        Step 1. Classify the most recent message as one of the following:
+        - "Policy related — same policy" if the message is a follow-up, clarification, or further question about the same specific company policy discussed earlier in the chat history.
+        - "Policy related — different policy" if the message asks about a different company policy than previously discussed.
+        - "Non-policy related" if the message is definitely a greeting or small talk.
+
+        Step 2. For policy related messages, check whether there is enough information to accurately retrieve documents related to the user's query.
+        If the message is about a different policy, only use the most recent message, ignore the chat history.
+        BOTH of the following must be present or can be reasonably inferred:
+        1. The domain of company policy. IT and HR are examples of domain.
+        2. Any context necessary to accurately understand the user's query such as employee role, specific situation, department, or location.
+
+        Step 3. Write a reply to the user, only when needed:
+        - If information is missing, conversationally ask for the specific information needed. Be clear and avoid asking for obvious details.
+        - If the message is non-policy related, do not answer it. Politely and concisely guide the user back to asking about company policies.
+        - Otherwise leave the reply empty.
+
+        Your response must follow the format below, with exactly one of the classes in the <intent></intent> tags and Yes or No in the <sufficient></sufficient> tags:
+        <intent>
+        Policy related — same policy
+        </intent>
+        <sufficient>
+        No
+        </sufficient>
+        <reply>
+        Could you let me know which location this applies to?
+        </reply>
+        Do not provide any further explanation.
+        <|eot_id|><|start_header_id|>user<|end_header_id|>
+    '''
+
+    human = '''
+        Here is the chat history: {effective_chat_history}
+        Here the user's most recent message: {last_user_message}
+
+        Please respond only with the format as shown above.
+
+        <|eot_id|><|start_header_id|>assistant<|end_header_id|>
+        '''
+
+    prompt = ChatPromptTemplate.from_messages([("system", system), ("human", human)])
+    chain = prompt | llm
+
+    try:
+        response = chain.invoke(
+            {'effective_chat_history': state['effective_chat_history'],
+             'last_user_message': state['last_user_message']
+            })
+        intent = re.findall(r'<intent>\s*(.*?)\s*</intent>', response.content, re.DOTALL)[0]
+        sufficient = re.findall(r'<sufficient>\s*(.*?)\s*</sufficient>', response.content, re.DOTALL)[0]
+        replies = re.findall(r'<reply>\s*(.*?)\s*</reply>', response.content, re.DOTALL)
+        reply = replies[0] if replies else ''
+    except Exception as e:
+        state['last_intent'] = 'None'
+        logger.warning(f"Error in fused intent and details, falling back to sequential nodes: {e}")
+        return state
+
+    state['last_intent'] = intent
+    logger.info(f"intent: {intent}, sufficient: {sufficient}, reply: {reply}")
+
+    if intent == "Policy related — different policy":
+        state = effective_context_removal(state)
+
+    if intent in ("Policy related — same policy", "Policy related — different policy", "Policy related"):
+        if sufficient == "Yes":
+            state['sufficient_details'] = "Yes"
+        else:
+            state['sufficient_details'] = "No"
+            state['effective_chat_history'].append(HumanMessage(content=state['last_user_message']))
+            state['effective_chat_history'].append(AIMessage(content=reply or 'Can you provide me with more details?'))
+            logger.info(f"Insufficient information provide by user")
+    elif intent == "Non-policy related" and reply:
+        state['effective_chat_history'].append(HumanMessage(content=state['last_user_message']))
+        state['effective_chat_history'].append(AIMessage(content=reply))
+        state['sufficient_details'] = "No"
+
+    logger.debug("-------- Normal exit of fused intent and details node --------")
+    return state
+
+def fused_conditional(state: DetailsGraphState) -> str:
+    '''
+    Determine whether the fused node finished the turn, or a sequential node still has to run
+    '''
+    logger.debug("-------- Entering fused conditional edge --------")
+
+    if state['last_intent'] == "end" or state['sufficient_details'] in ("Yes", "No"):
+        logger.info(f"last intent: {state['last_intent']} -> exit")
+        return "end"
+    elif state['last_intent'] == "Non-policy related":
+        logger.info(f"last intent: {state['last_intent']} without reply -> divert")
+        return "divert"
+    else:
+        logger.info(f"last intent: {state['last_intent']} -> sequential fallback")
+        return "fallback"
+
 def divert_to_policy(state: DetailsGraphState) -> DetailsGraphState:
     '''
     prompt to that allows agent to divert user back to policy questions.
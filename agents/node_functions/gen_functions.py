@@ -1,4 +1,7 @@
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from logger import get_logger
 from ..graph_states import GenGraphState
 from ..llms import llm, llm2
@@ -6,10 +9,16 @@ from langchain_core.messages import BaseMessage, ToolMessage, HumanMessage, AIMe
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from .tool_functions import tools_dict
-from config import COLLECTION_CATEGORIES
+from config import COLLECTION_CATEGORIES, TOOL_CALL_MAX_WORKERS, TOOL_CALL_TIMEOUT, ANSWER_CACHE_ENABLED
+from utils.answer_cache import answer_cache
+from utils.chroma_db import collection_helper
+from utils.token_budget import context_budget, token_counter
 
 logger = get_logger(__name__)
 
+# shared pool so concurrent requests reuse threads instead of spawning their own
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_CALL_MAX_WORKERS, thread_name_prefix="tool-call")
+
 def decide_retrieve(state: GenGraphState) -> GenGraphState:
     '''
     Prompt to determine if more company policy information is needed to be retrieved.
@@ -74,21 +83,48 @@ def retrieve_policy(state: GenGraphState) -> GenGraphState:
     logger.debug("-------- Entering retrieve policy node --------")
 
     tool_calls = state['tool_invoke'][-1].tool_calls
-    results = []
 
+    # start every tool call at once, a multi-domain turn then takes as long as its slowest lookup
+    futures = []
     for t in tool_calls:
         if not t['name'] in tools_dict:
             logger.warning(f"tool with incorrect name was called")
+            futures.append(None)
+        else:
+            # invoked with the tool call so the ToolMessage keeps the retrieved doc hashes as artifact
+            futures.append(tool_executor.submit(
+                tools_dict[t['name']].invoke,
+                {
+                    "name":t['name'],
+                    "args":{
+                        "query":t['args'].get('query', ''),
+                        "domain":t['args'].get('domain', '')
+                    },
+                    "id":t['id'],
+                    "type":"tool_call"
+                }
+            ))
+
+    deadline = time.monotonic() + TOOL_CALL_TIMEOUT
+    results = []
+    for t, future in zip(tool_calls, futures):
+        if future is None:
             result = "Incorrect tool name."
         else:
-            query=t['args'].get('query', '')
-            domain=t['args'].get('domain', '')
-            
-            result = tools_dict[t['name']].invoke({
-                "query":t['args'].get('query', ''),
-                "domain":t['args'].get('domain', '')
-            })
-            logger.debug(f"result: {result} from a tool call performed")
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+                logger.debug(f"result: {result} from a tool call performed")
+            except FutureTimeoutError:
+                # drop it from the shared pool if it has not started, so it cannot delay other requests
+                future.cancel()
+                logger.warning(f"Tool call {t['id']} timed out after {TOOL_CALL_TIMEOUT}s")
+                result = "Tool call timed out."
+            except Exception as e:
+                logger.warning(f"Tool call {t['id']} failed: {e}")
+                result = "Tool call failed."
+        if isinstance(result, ToolMessage):
+            results.append(result)
+            continue
         results.append(
             ToolMessage(
                 tool_call_id = t['id'], 
@@ -101,6 +137,105 @@ def retrieve_policy(state: GenGraphState) -> GenGraphState:
     logger.debug("-------- Normal exit of retrieve policy node --------")
     return state
 
+def _answer_cache_domain(tool_calls: list) -> str:
+    '''
+    Domains of the retrieval tool calls of a turn, normalised and sorted into one cache key
+    '''
+    domains = {
+        collection_helper.match_category(t['args'].get('domain', '')) or t['args'].get('domain', '')
+        for t in tool_calls
+    }
+    return ",".join(sorted(domains))
+
+def check_answer_cache(state: GenGraphState) -> GenGraphState:
+    '''
+    Reuse the summary and answer of a near-identical context-free question asked before in the same domain
+    '''
+    logger.debug("-------- Entering check answer cache node --------")
+
+    # only questions that do not depend on earlier messages can share answers
+    if not ANSWER_CACHE_ENABLED or state['effective_chat_history']:
+        state['answer_cached'] = "Skip"
+        logger.debug("-------- Skip exit of check answer cache node --------")
+        return state
+    state['answer_cached'] = "No"
+
+    try:
+        domain = _answer_cache_domain(state['tool_invoke'][-1].tool_calls)
+        embedding = collection_helper.embed_texts([state['last_user_message']])[0]
+        entry = answer_cache.lookup(embedding, domain, state['last_user_message'])
+    except Exception as e:
+        logger.warning(f"Error looking up answer cache: {e}")
+        entry = None
+
+    if entry is not None:
+        state['document_summary'] = entry['summary']
+        state['effective_chat_history'].append(HumanMessage(content=state['last_user_message']))
+        state['effective_chat_history'].append(AIMessage(content=entry['answer']))
+        state['answer_cached'] = "Yes"
+        logger.info(f"Cached answer of '{entry['question']}' reused")
+
+    logger.debug("-------- Normal exit of check answer cache node --------")
+    return state
+
+def answer_cache_conditional(state: GenGraphState) -> str:
+    '''
+    Conditional to end the turn with a cached answer or retrieve documents
+    '''
+    logger.debug("-------- Entering answer cache conditional edge --------")
+
+    if state['answer_cached'] == "Yes":
+        logger.info("Answer cache hit")
+        return "hit"
+    else:
+        logger.info("Answer cache miss")
+        return "miss"
+
+def cache_answer(state: GenGraphState) -> GenGraphState:
+    '''
+    Store the summary and answer of a context-free question answered from retrieved documents
+    '''
+    logger.debug("-------- Entering cache answer node --------")
+
+    history = state['effective_chat_history']
+    retrieved = len(state['tool_invoke']) >= 2 and isinstance(state['tool_invoke'][-1], list)
+    # "No" is only set for context-free questions that missed the cache
+    if (
+        not ANSWER_CACHE_ENABLED
+        or state.get('answer_cached') != "No"
+        or not retrieved
+        or len(history) != 2
+        or not isinstance(history[-1], AIMessage)
+        or state['document_summary'] in ('', 'None')
+    ):
+        logger.debug("-------- Skip exit of cache answer node --------")
+        return state
+
+    doc_hashes = [
+        doc_hash
+        for m in state['tool_invoke'][-1] if isinstance(m, ToolMessage) and m.artifact
+        for doc_hash in m.artifact
+    ]
+    if not doc_hashes:
+        logger.debug("-------- Skip exit of cache answer node --------")
+        return state
+
+    try:
+        answer_cache.put(
+            embedding=collection_helper.embed_texts([state['last_user_message']])[0],
+            domain=_answer_cache_domain(state['tool_invoke'][-2].tool_calls),
+            question=state['last_user_message'],
+            summary=state['document_summary'],
+            answer=history[-1].content,
+            doc_hashes=doc_hashes
+        )
+        logger.info(f"Answer to '{state['last_user_message']}' cached")
+    except Exception as e:
+        logger.warning(f"Error caching answer: {e}")
+
+    logger.debug("-------- Normal exit of cache answer node --------")
+    return state
+
 def document_summary(state: GenGraphState) -> GenGraphState:
     '''
     Prompt to summarise documents retrieved in relation to user query.
@@ -108,11 +243,13 @@ def document_summary(state: GenGraphState) -> GenGraphState:
 
     logger.debug("-------- Entering document summary node --------")
 
-    if type(state['tool_invoke'][-1][-1]) != ToolMessage:
+    tool_messages = [m for m in state['tool_invoke'][-1] if type(m) == ToolMessage]
+    if not tool_messages:
         logger.info("No document match query, retrival result is empty.")
         return state
     
-    documents = state['tool_invoke'][-1][-1].content
+    # one tool message per domain asked about, in tool call order
+    documents = "\n".join(m.content for m in tool_messages)
     query = state['last_user_message']
 
     system = '''
@@ -164,13 +301,54 @@ def document_summary(state: GenGraphState) -> GenGraphState:
     logger.debug("-------- Normal exit of document summary node --------")
     return state
 
+# answer prompt, module level so check_context_length can measure the template
+ANSWER_SYSTEM_PROMPT = '''
+        <|begin_of_text|><|start_header_id|>system<|end_header_id|>
+        You are a highly knowledgeable, concise, and unbiased AI assistant.
+        Your job is to answer user questions as accurately and helpfully as possible, using all available information.
+        
+        - You have access to two additional sources of information:
+            1. Externally retrieved information provided in <context></context>.
+            2. Chat history provided in <messages></messages>.
+        - Always use relevant information from context and messages to generate your response to user input.
+        - Provide the most direct and relevant answer first, followed by a brief explanation if necessary.
+        - If you do not know the answer, state this honestly.
+        - Maintain a neutral, professional, and helpful tone. 
+        
+        <context>
+        {context}
+        </context>
+
+        <messages>
+        {messages}
+        <messages/>
+
+        <|eot_id|><|start_header_id|>user<|end_header_id|>
+    '''
+
+ANSWER_HUMAN_PROMPT = '''
+        Here is the user input:
+        {last_user_message}
+
+        Carefully analyze the input and provide concise answer.
+        <|eot_id|><|start_header_id|>assistant<|end_header_id|>
+    '''
+
 def check_context_length(state: GenGraphState) -> GenGraphState:
     '''
-    Function that uses the LLM tokeniser to check if prompt will be greater than context window
+    Function that checks the answer prompt against per-section token budgets for template, document summary,
+    chat history and user message. Uses the LLM tokeniser if available locally, else a calibrated estimate.
     '''
     logger.debug("-------- Entering check context length node --------")
-    # Can't permission for llama huggingface to get tokeniser 
-    state['within_token_limit'] = "Yes"
+
+    within_limit = context_budget.fits(
+        ANSWER_SYSTEM_PROMPT + ANSWER_HUMAN_PROMPT,
+        state['document_summary'],
+        state['last_user_message'],
+        state['effective_chat_history']
+    )
+    state['within_token_limit'] = "Yes" if within_limit else "No"
+
     logger.debug("-------- Normal exit of check context length node --------")
     return state
 
@@ -190,11 +368,16 @@ def context_length_conditional(state: GenGraphState) -> str:
 
 def truncate_chat_history(state: GenGraphState) -> GenGraphState:
     '''
-    Truncates the chat history to ensure prompt does not exceed context window
+    Trims document summary and chat history to their token budgets in a single pass, keeping the newest messages
     '''
     logger.debug("-------- Entering truncate chat history node --------")
-    state['effective_chat_history'] = state['effective_chat_history'][4:]
-    logger.info("Remove 2 oldest user-llm interaction ie 4 messages")
+    state['document_summary'], state['effective_chat_history'] = context_budget.fit(
+        ANSWER_SYSTEM_PROMPT + ANSWER_HUMAN_PROMPT,
+        state['document_summary'],
+        state['last_user_message'],
+        state['effective_chat_history']
+    )
+    state['within_token_limit'] = "Yes"
     logger.debug("-------- Normal exit of truncate chat history node --------")
     return state
 
@@ -205,48 +388,22 @@ def answer_user_query(state: GenGraphState) -> GenGraphState:
 
     logger.debug("-------- Entering answer user query node --------")
 
-    system = '''
-        <|begin_of_text|><|start_header_id|>system<|end_header_id|>
-        You are a highly knowledgeable, concise, and unbiased AI assistant.
-        Your job is to answer user questions as accurately and helpfully as possible, using all available information.
-        
-        - You have access to two additional sources of information:
-            1. Externally retrieved information provided in <context></context>.
-            2. Chat history provided in <messages></messages>.
-        - Always use relevant information from context and messages to generate your response to user input.
-        - Provide the most direct and relevant answer first, followed by a brief explanation if necessary.
-        - If you do not know the answer, state this honestly.
-        - Maintain a neutral, professional, and helpful tone. 
-        
-        <context>
-        {context}
-        </context>
-
-        <messages>
-        {messages}
-        <messages/>
-
-        <|eot_id|><|start_header_id|>user<|end_header_id|>
-    '''
-    
-    human = '''
-        Here is the user input:
-        {last_user_message}
-
-        Carefully analyze the input and provide concise answer.
-        <|eot_id|><|start_header_id|>assistant<|end_header_id|>
-    '''
-
-    prompt = ChatPromptTemplate.from_messages([("system", system), ("human", human)])
+    prompt = ChatPromptTemplate.from_messages([("system", ANSWER_SYSTEM_PROMPT), ("human", ANSWER_HUMAN_PROMPT)])
     chain = prompt | llm
+    inputs = {
+        'last_user_message': context_budget.cap_user_message(state['last_user_message']),
+        'messages': state['effective_chat_history'],
+        'context': state['document_summary']
+    }
 
     try:
-        response = chain.invoke({
-            'last_user_message': state['last_user_message'],
-            'messages': state['effective_chat_history'],
-            'context': state['document_summary']
-        })
+        response = chain.invoke(inputs)
         logger.info(f"generated response from llm: {response} ")
+        # calibrate the token estimate with the prompt size Groq reports, cache hits replay old usage
+        usage = getattr(response, 'usage_metadata', None)
+        if usage and not response.response_metadata.get('llm_cache_hit'):
+            prompt_chars = sum(len(m.content) for m in prompt.format_messages(**inputs))
+            token_counter.observe(prompt_chars, usage.get('input_tokens', 0))
     except Exception as e:
         logger.warning(f"Error occured during generation: {e}")
         response = "Error generating"
@@ -1,15 +1,18 @@
 from langchain_core.tools import tool
 from langchain_chroma import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
-from config import NUM_OF_DOCS_RETRIEVED, CHROMA_DB_DIR
-import chromadb
-from chromadb.utils import embedding_functions
-from chromadb.api.models.Collection import Collection
+from config import (
+    NUM_OF_DOCS_RETRIEVED, POLICY_COLLECTION_NAME, HYBRID_RETRIEVAL,
+    RERANK_ENABLED, RERANK_CANDIDATES, RERANK_TOP_K
+)
+from exceptions import CollectionNotFoundException
+from utils.chroma_db import collection_helper
+from utils.reranker import reranker
 from logger import get_logger
 
 logger = get_logger(__name__)
 
-@tool
+@tool(response_format="content_and_artifact")
 def policy_retrieval_tool(query:str, domain:str):
     '''
     Retrieve company policy documents.
@@ -18,43 +21,41 @@ def policy_retrieval_tool(query:str, domain:str):
     - query: The user's input question.
     - domain: The policy domain
     '''
+    # the artifact lists the hashes of documents the chunks came from, it is not sent to the LLM
 
     logger.info(f"Tool call with query:'{query}' and domain:'{domain}' performed.")
 
-    try:
-        client = chromadb.PersistentClient(path=CHROMA_DB_DIR)
-        logger.info(f"Successfully get chromadb client.")
-    except Exception as e:
-        logger.warning(f"Error in getting chromadb client: {e}.")
-        return "Unable to get chroma client"
+    collection_name = POLICY_COLLECTION_NAME
 
     try:
-        collection_name = "policies"
-        collection = client.get_collection(name=collection_name)
-        logger.info(f"Get collection '{collection_name}' successfully.")
-    except Exception as e:
+        # routed to the domain's partition, every partition is searched if the domain is unknown
+        query_result = collection_helper.query_partitions(
+            collection_name=collection_name,
+            query_text=query,
+            category=domain,
+            n_results=RERANK_CANDIDATES if RERANK_ENABLED else NUM_OF_DOCS_RETRIEVED,
+            hybrid=HYBRID_RETRIEVAL
+        )
+    except CollectionNotFoundException as e:
         logger.warning(f"Unable to get collection '{collection_name}': {e}.")
-        return "Unable to find collection"
-    
-    filter_keys = {"category": domain}
+        return "Unable to find collection", []
 
-    try:
-        query_result = collection.query(
-            query_texts=[query],
-            n_results=NUM_OF_DOCS_RETRIEVED,
-            where=filter_keys
-        )
-        logger.info(f"Query from collection '{collection_name}' successfully.")
-    except Exception as e:
-        logger.warning(f"Unable to query collection '{collection_name}': {e}.")
-        return "Unable to query collection"
+    if query_result is None:
+        return "Unable to query collection", []
 
     docs = query_result['documents'][0]
+    metadatas = query_result['metadatas'][0]
     logger.info(f"{len(docs)} of chunks retrieved.")
 
     # if not docs retrieved
     if not docs:
-        return "No relevant information"
+        return "No relevant information", []
+
+    if RERANK_ENABLED:
+        order = reranker.rerank(query, docs, top_k=RERANK_TOP_K)
+        order = order if order is not None else list(range(min(len(docs), NUM_OF_DOCS_RETRIEVED)))
+        docs = [docs[i] for i in order]
+        metadatas = [metadatas[i] for i in order]
 
     """
     if domain == "IT":
@@ -83,7 +84,8 @@ def policy_retrieval_tool(query:str, domain:str):
         results.append(f'document {i+1}: \n {doc.page_content}')
     """
     
-    return "\n".join(docs)
+    doc_hashes = list(dict.fromkeys(m['doc_hash'] for m in metadatas if m and 'doc_hash' in m))
+    return "\n".join(docs), doc_hashes
 
 tools = [policy_retrieval_tool]
 tools_dict = {tool.name:tool for tool in tools}
\ No newline at end of file
@@ -13,15 +13,75 @@ GEN_TYPES = {
     "GROQ": GEN_LLM,  # Groq expects model string
     "LOCAL": os.path.join(LOCAL_MODELS_DIR, GEN_LLM)  # llama.cpp expects path
 }
+DETAILS_GRAPH_MODE = "fused"  # "fused" (intent and details in one LLM call) | "sequential"
+INTENT_CLASSIFIER_ENABLED = True  # classify intent with the embedding model, LLM only when unsure
+INTENT_CONFIDENCE_THRESHOLD = 0.8  # softmax probability of the nearest class
+INTENT_SOFTMAX_TEMPERATURE = 0.02
+SAME_POLICY_SIMILARITY = 0.85  # similarity to previous user turn, between the two the LLM decides
+DIFFERENT_POLICY_SIMILARITY = 0.6
+LLM_CACHE_ENABLED = True  # reuse responses to identical prompts, all LLMs run at temperature 0
+LLM_CACHE_PATH = os.path.join(AGENTS_DIR, "llm_cache.db")  # None keeps the cache in memory only
+LLM_CACHE_MAX_ENTRIES = 10_000
+LLM_CACHE_TTL_SECONDS = 24 * 60 * 60
+ANSWER_CACHE_ENABLED = True  # reuse answers to near-identical context-free policy questions
+ANSWER_CACHE_PATH = os.path.join(AGENTS_DIR, "answer_cache.db")
+ANSWER_CACHE_SIMILARITY = 0.95  # cosine similarity of question embeddings
+# role and situation terms a cached answer must share with the question, numbers always count
+ANSWER_CACHE_DETAIL_TERMS = [
+    "intern", "trainee", "contractor", "contract", "temporary", "part-time", "full-time", "probation",
+    "new hire", "executive", "senior executive", "assistant manager", "manager", "vice president", "director",
+    "remote", "overseas", "local", "foreign",
+]
+ANSWER_CACHE_MAX_ENTRIES = 5_000
+ANSWER_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+LLM_TOKENIZER_PATH = os.path.join(LOCAL_MODELS_DIR, "llama-3.1-8b-instant-tokenizer")  # optional, local only
+LLM_CHARS_PER_TOKEN = 3.6  # estimator when the tokenizer is missing, calibrated from reported usage
+LLM_PROMPT_TOKEN_BUDGET = 3000  # answer prompt, all sections together
+CONTEXT_BUDGET_SYSTEM = 400
+CONTEXT_BUDGET_SUMMARY = 400
+CONTEXT_BUDGET_HISTORY = 1800
+CONTEXT_BUDGET_USER_MESSAGE = 400
 
 # RAG Configs
 RAG_EMBED_MODEL = "arctic-embed-m"
 EMBED_MODEL_PATH = os.path.join(LOCAL_MODELS_DIR, RAG_EMBED_MODEL)
+EMBED_BACKEND = "torch"  # "torch" | "onnx" | "onnx-int8", export with utils/hf_models.py first
+EMBED_ONNX_QUANTIZATION = "avx2"  # "arm64" | "avx2" | "avx512" | "avx512_vnni"
 CHROMA_DB_DIR = os.path.join(AGENTS_DIR, "policy_vector_db")
+VECTOR_BACKEND = "chroma"  # "chroma" | "flat" (exact search over a memory-mapped .npy matrix)
+FLAT_INDEX_DIR = os.path.join(AGENTS_DIR, "policy_flat_index")
+FLAT_INDEX_DTYPE = "float32"  # "float32" | "float16", halves memory and storage, but queries upcast it and run slower
+EMBED_CACHE_PATH = os.path.join(AGENTS_DIR, "embedding_cache.db")
+EMBED_CACHE_MAX_ENTRIES = 200_000
+EMBED_BATCH_SIZE = 32
+EMBED_NUM_THREADS = None  # None keeps torch's default intra-op thread count
 DOCUMENTS_DIR = os.path.join(BASE_DIR, "documents")
+PDF_LOAD_WORKERS = os.cpu_count() or 1
+CHUNK_MODE = "characters"  # "characters" | "tokens" (embedding model tokens, split at section headings)
 CHUNK_SIZE = 500
 CHUNK_OVERLAP = 50
+CHUNK_TOKEN_SIZE = 510  # arctic-embed-m reads at most 512 tokens including [CLS] and [SEP]
+CHUNK_TOKEN_OVERLAP = 50
+INGEST_BATCH_SIZE = 64
+WATCH_DOCUMENTS_DIR = False  # ingest changes to DOCUMENTS_DIR in the background while the API runs
+WATCH_POLL_INTERVAL = 5.0  # seconds between scans, also the fallback when watchdog is not installed
+WATCH_DEBOUNCE_SECONDS = 2.0  # wait for the directory to be quiet this long before ingesting
+WATCH_LOCK_PATH = os.path.join(AGENTS_DIR, "document_watcher.lock")  # only one API worker process runs the watcher
+WATCH_STOP_TIMEOUT = 30.0  # seconds shutdown waits for a sync to reach the end of its current batch
 NUM_OF_DOCS_RETRIEVED = 3
+HYBRID_RETRIEVAL = True  # fuse BM25 and vector results with reciprocal-rank fusion
+BM25_INDEX_DIR = os.path.join(AGENTS_DIR, "policy_bm25")
+HYBRID_CANDIDATES = 10  # results taken from each retriever before fusion
+RRF_K = 60
+RERANK_ENABLED = False  # rescore over-fetched candidates with a local cross-encoder
+RERANK_MODEL_PATH = os.path.join(LOCAL_MODELS_DIR, "ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = 12
+RERANK_TOP_K = 2
+RERANK_TIME_BUDGET_MS = 300  # fall back to retrieval order when reranking takes longer
+TOOL_CALL_MAX_WORKERS = 4  # tool calls of one LLM turn run concurrently
+TOOL_CALL_TIMEOUT = 20.0  # seconds
 COLLECTION_CATEGORIES = ["HR", "IT", "Finance"]
+POLICY_COLLECTION_NAME = "policies"
+PARTITION_BY_CATEGORY = True  # one collection per category, e.g. "policies_hr", instead of a where filter
 
 
@@ -1,13 +1,35 @@
+from sqlalchemy import inspect, text
 from sqlmodel import SQLModel, create_engine, Session
 
-DATABASE_URL = "sqlite:///app.db"  
+DATABASE_URL = "sqlite:///app.db"
 
 # Create engine
 engine = create_engine(DATABASE_URL, echo=True)  # echo=True logs SQL
 
+# Add columns introduced after a table was created, create_all only creates missing tables
+def add_missing_columns():
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column.type.compile(engine.dialect)}'
+                if column.default is not None and column.default.is_scalar:
+                    default = column.default.arg
+                    ddl += " DEFAULT " + ("'" + default.replace("'", "''") + "'" if isinstance(default, str) else str(default))
+                connection.execute(text(ddl))
+                for index in table.indexes:
+                    if column in index.columns:
+                        index.create(connection, checkfirst=True)
+
 # Create tables function
 def init_db():
     SQLModel.metadata.create_all(engine)
+    add_missing_columns()
 
 # Dependency to get a DB session in routes
 def get_session():
@@ -16,4 +38,4 @@ def get_session():
 
 # for single use sessions
 def get_session_direct() -> Session:
-    return Session(engine)
\ No newline at end of file
+    return Session(engine)
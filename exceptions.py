@@ -26,6 +26,13 @@ class MetadataUpdateException(Exception):
     """Raised when updating metadata in Chroma fails"""
     pass
 
+class IngestionBatchException(Exception):
+    """Raised when a batch of chunks cannot be added to Chroma during ingestion"""
+    def __init__(self, collection_name: str, batch_number: int):
+        self.collection_name = collection_name
+        self.batch_number = batch_number
+        super().__init__(f"Failed to add batch {batch_number} to collection '{collection_name}'.")
+
 # ====================
 # user exceptions
 # ====================
@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+from config import DOCUMENTS_DIR, POLICY_COLLECTION_NAME, INGEST_BATCH_SIZE, PDF_LOAD_WORKERS
+from database import init_db
+from exceptions import IngestionBatchException
+from logger import get_logger
+from utils.chroma_db import chunking_helper, collection_helper, list_source_files
+from utils.ingestion import IngestionPipeline
+
+logger = get_logger(__name__)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ingest policy documents into the vector store.")
+    parser.add_argument("paths", nargs="*", help="Files or directories to ingest. Defaults to DOCUMENTS_DIR.")
+    parser.add_argument("--collection", default=POLICY_COLLECTION_NAME, help="Collection to ingest into.")
+    parser.add_argument("--category", default=None, help="Category of every document. Inferred from file names if omitted.")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE, help="Chunks added per batch.")
+    parser.add_argument("--workers", type=int, default=PDF_LOAD_WORKERS, help="Processes used to parse files.")
+    parser.add_argument("--skip-reconcile", action="store_true", help="Do not reconcile Chroma with SQLite before ingesting.")
+    parser.add_argument("--rebuild-sparse-index", action="store_true", help="Rebuild the BM25 index from the collection after ingesting.")
+    return parser.parse_args()
+
+def main() -> int:
+    """
+    Resumable ingestion entry point.
+
+    Reconciles the collection with SQLite, then ingests the given files, resuming any
+    document interrupted by an earlier run from its last committed batch. Prints
+    throughput of each stage when done.
+    """
+    args = parse_args()
+    init_db()
+
+    file_paths = []
+    for path in args.paths or [DOCUMENTS_DIR]:
+        # sources are stored as absolute paths, like the watcher's
+        file_paths.extend(list_source_files(path) if os.path.isdir(path) else [os.path.abspath(path)])
+
+    pipeline = IngestionPipeline(
+        chunking_helper,
+        collection_helper,
+        batch_size=args.batch_size,
+        max_workers=args.workers
+    )
+
+    if not args.skip_reconcile:
+        print(f"Reconcile: {pipeline.reconcile(args.collection)}")
+
+    start = time.perf_counter()
+    try:
+        stats = pipeline.ingest_files(file_paths, args.collection, category=args.category)
+        exit_code = 0
+    except IngestionBatchException as e:
+        logger.error(f"{e} Re-run to resume from the last committed batch.")
+        stats = None
+        exit_code = 1
+    elapsed = time.perf_counter() - start
+
+    if stats is not None:
+        print(f"Ingested: {stats}")
+        if args.rebuild_sparse_index:
+            indexed = sum(
+                collection_helper.rebuild_sparse_index(name)
+                for name in collection_helper.partition_names(args.collection)
+                if collection_helper.get_collection(name) is not None
+            )
+            print(f"BM25 index rebuilt with {indexed} chunk(s)")
+    print(f"Total time: {elapsed:.2f}s")
+    print(pipeline.last_stats.report())
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -81,7 +81,8 @@ def query_agent(session: Session, chat_id: int, last_user_message: str) -> str:
         'effective_chat_history': effective_chat_history,
         'last_intent': "",
         'sufficient_details': "",
-        'document_summary':document_summary
+        'document_summary':document_summary,
+        'local_intent_checked': ""
     }
     
     details_graph_state = details_graph.invoke(details_graph_state)
@@ -106,7 +107,8 @@ def query_agent(session: Session, chat_id: int, last_user_message: str) -> str:
             'effective_chat_history': details_graph_state['effective_chat_history'], # in case of context removal
             'document_summary': details_graph_state['document_summary'], # in case of context removal
             'within_token_limit':"",
-            'tool_invoke':[]
+            'tool_invoke':[],
+            'answer_cached':""
         }
 
         gen_graph_state = gen_graph.invoke(gen_graph_state)
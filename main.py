@@ -1,6 +1,7 @@
 from fastapi import FastAPI
+from config import WATCH_DOCUMENTS_DIR, RERANK_ENABLED
 from database import init_db
-from routes import user_routes, chat_routes, message_routes
+from routes import user_routes, chat_routes, message_routes, metrics_routes
 
 app = FastAPI()
 
@@ -8,8 +9,22 @@ app = FastAPI()
 @app.on_event("startup")
 def on_startup():
     init_db()
+    if RERANK_ENABLED:
+        # load the cross-encoder before serving, the first queries would otherwise exceed their budget
+        from utils.reranker import reranker
+        reranker.warmup()
+    if WATCH_DOCUMENTS_DIR:
+        from utils.ingestion_watcher import document_watcher
+        document_watcher.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    if WATCH_DOCUMENTS_DIR:
+        from utils.ingestion_watcher import document_watcher
+        document_watcher.stop()
 
 # Include routes
 app.include_router(user_routes.router)
 app.include_router(chat_routes.router)
-app.include_router(message_routes.router)
\ No newline at end of file
+app.include_router(message_routes.router)
+app.include_router(metrics_routes.router)
\ No newline at end of file
@@ -2,6 +2,7 @@ from datetime import datetime
 from enum import Enum
 from typing import Optional, List
 from sqlmodel import SQLModel, Field, Relationship
+from config import POLICY_COLLECTION_NAME
 from utils import sg_datetime
 
 class RankEnum(str, Enum):
@@ -115,9 +116,73 @@ class DocumentDB(SQLModel, table=True):
     Attributes:
         hash: Unique identifier of message.
         source: Chat id of the chat that message belongs to
+        collection: Base collection the document was ingested into.
         created_at: Timestamp when the message was created.
  
     """
     hash: str = Field(primary_key=True)
     source: str
-    created_at: datetime = Field(default_factory=sg_datetime.get_sgt_time)
\ No newline at end of file
+    collection: str = Field(default=POLICY_COLLECTION_NAME, index=True)
+    created_at: datetime = Field(default_factory=sg_datetime.get_sgt_time)
+
+class FileFingerprintDB(SQLModel, table=True):
+    """
+    Represents the fingerprint of a source file last ingested.
+
+    Attributes:
+        path: Path of the source file.
+        size: File size in bytes.
+        mtime: File modification time.
+        file_hash: MD5 of the raw file bytes.
+        modified_at: Timestamp when the fingerprint was last written.
+ 
+    """
+    path: str = Field(primary_key=True)
+    size: int
+    mtime: float
+    file_hash: str = Field(index=True)
+    modified_at: datetime = Field(default_factory=sg_datetime.get_sgt_time)
+
+
+class ChunkDB(SQLModel, table=True):
+    """
+    Represents a chunk stored in the vector store.
+
+    Attributes:
+        chunk_id: Id of the chunk in the vector store.
+        doc_hash: Hash of the document the chunk belongs to.
+        ordinal: Position of the chunk within its document.
+        start_index: Character offset where the chunk starts in the document text.
+        end_index: Character offset where the chunk ends in the document text.
+        token_count: Number of embedding model tokens in the chunk.
+ 
+    """
+    chunk_id: str = Field(primary_key=True)
+    doc_hash: str = Field(index=True)
+    ordinal: int
+    start_index: int
+    end_index: int
+    token_count: int
+
+
+class IngestionCheckpointDB(SQLModel, table=True):
+    """
+    Represents ingestion progress of a source file, used to resume after a crash.
+
+    Attributes:
+        source: Path of the source file.
+        doc_hash: Hash of the document being ingested.
+        collection: Base collection the document is ingested into.
+        total_chunks: Number of chunks of the document.
+        committed_chunks: Number of leading chunks already added to the collection.
+        status: in_progress | done
+        modified_at: Timestamp when the checkpoint was last written.
+ 
+    """
+    source: str = Field(primary_key=True)
+    doc_hash: str = Field(index=True)
+    collection: str = Field(default=POLICY_COLLECTION_NAME, index=True)
+    total_chunks: int
+    committed_chunks: int = Field(default=0)
+    status: str = Field(default="in_progress")
+    modified_at: datetime = Field(default_factory=sg_datetime.get_sgt_time)
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from utils.answer_cache import answer_cache
+from utils.chroma_db import collection_helper
+from utils.intent_classifier import intent_classifier
+from utils.llm_cache import llm_cache
+
+router = APIRouter()
+
+@router.get("/metrics", tags=["Metrics"])
+def get_metrics_endpoint():
+    """ API endpoint to get hit rates of the local classifiers and caches of this process. """
+    embedding_cache = collection_helper.embedding_cache
+    return {
+        "intent_classifier": intent_classifier.stats(),
+        "llm_cache": llm_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+    }
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# point every store at a scratch directory before the utils modules build their singletons
+import config
+
+_TMP_DIR = tempfile.mkdtemp(prefix="policy-agent-tests-")
+config.CHROMA_DB_DIR = os.path.join(_TMP_DIR, "chroma")
+config.FLAT_INDEX_DIR = os.path.join(_TMP_DIR, "flat")
+config.BM25_INDEX_DIR = os.path.join(_TMP_DIR, "bm25")
+config.EMBED_CACHE_PATH = os.path.join(_TMP_DIR, "embedding_cache.db")
+config.ANSWER_CACHE_PATH = os.path.join(_TMP_DIR, "answer_cache.db")
+config.LLM_CACHE_PATH = os.path.join(_TMP_DIR, "llm_cache.db")
+config.VECTOR_BACKEND = "flat"
+
+class FakeEmbeddingFunction:
+    """ Deterministic stand-in for the sentence-transformer, records every text it embeds. """
+
+    def __init__(self, *args, **kwargs):
+        self.embedded = []
+
+    def __call__(self, texts):
+        self.embedded.extend(texts)
+        return [
+            [byte / 255 for byte in hashlib.sha256(text.encode("utf-8")).digest()[:16]]
+            for text in texts
+        ]
+
+from chromadb.utils import embedding_functions
+embedding_functions.SentenceTransformerEmbeddingFunction = FakeEmbeddingFunction
+
+import database
+from sqlmodel import create_engine
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """ Fresh SQLite database for each test. """
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    monkeypatch.setattr(database, "engine", engine)
+    database.init_db()
+    return engine
+
+@pytest.fixture
+def collection_utils(tmp_path, db):
+    """ Flat backend CollectionUtils in a scratch directory, without embedding cache. """
+    from utils.chroma_db import CollectionUtils
+    return CollectionUtils(
+        chroma_db_dir=str(tmp_path / "vectors"),
+        embed_model_path=config.EMBED_MODEL_PATH,
+        sparse_index_dir=str(tmp_path / "bm25"),
+        vector_backend="flat",
+    )
+
+@pytest.fixture
+def chunking_utils():
+    from utils.chroma_db import ChunkingUtils
+    return ChunkingUtils(chunk_size=200, chunk_overlap=20)
+
+@pytest.fixture
+def pipeline(chunking_utils, collection_utils):
+    from utils.ingestion import IngestionPipeline
+    return IngestionPipeline(chunking_utils, collection_utils, batch_size=8, max_workers=None)
+
+def write_docx(path, paragraphs):
+    """ Write a docx with one paragraph per entry. """
+    import docx
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(str(path))
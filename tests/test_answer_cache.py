@@ -0,0 +1,32 @@
+from utils.answer_cache import SemanticAnswerCache
+
+def make_cache(tmp_path):
+    return SemanticAnswerCache(
+        cache_path=str(tmp_path / "answer_cache.db"),
+        similarity_threshold=0.95,
+        max_entries=100,
+        ttl_seconds=None,
+    )
+
+def test_questions_differing_only_in_role_do_not_share_answers(tmp_path):
+    cache = make_cache(tmp_path)
+    embedding = [0.6, 0.8, 0.0]
+    cache.put(
+        embedding=embedding,
+        domain="HR",
+        question="How many days of annual leave do interns get?",
+        summary="Interns accrue 1 day of leave per month.",
+        answer="Interns get 12 days of annual leave.",
+        doc_hashes=["hr-handbook"],
+    )
+
+    # identical embedding, only the role differs
+    assert cache.lookup(embedding, "HR", "How many days of annual leave do executives get?") is None
+    assert cache.lookup(embedding, "HR", "How many days of annual leave does an intern get?")["answer"] == (
+        "Interns get 12 days of annual leave."
+    )
+
+def test_detail_key_folds_plurals_and_keeps_numbers(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.detail_key("Leave for senior executives after 5 years") == "5,senior executive"
+    assert cache.detail_key("What is the leave policy?") == ""
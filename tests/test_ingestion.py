@@ -0,0 +1,100 @@
+import os
+from sqlmodel import select
+from conftest import write_docx
+from database import get_session_direct
+from models import DocumentDB
+
+def policy_paragraphs(count, edited=None):
+    """ Distinct paragraphs of policy text, paragraph `edited` reworded. """
+    paragraphs = [
+        f"Clause {i}. Employees may apply for benefit {i} through the portal at least {i + 2} working days "
+        f"in advance, and their reporting manager approves or rejects the request within {i + 1} days."
+        for i in range(count)
+    ]
+    if edited is not None:
+        paragraphs[edited] = f"Clause {edited}. This benefit was withdrawn and is no longer offered to anyone."
+    return paragraphs
+
+def test_reingest_through_absolute_path_replaces_relative_version(tmp_path, monkeypatch, pipeline, collection_utils):
+    docs_dir = tmp_path / "docs"
+    docs_dir.mkdir()
+    file_path = docs_dir / "Fake HR Policy Handbook.docx"
+    write_docx(file_path, policy_paragraphs(6))
+
+    monkeypatch.chdir(tmp_path)
+    pipeline.ingest_files([os.path.join("docs", file_path.name)], "policies")
+
+    write_docx(file_path, policy_paragraphs(6, edited=2))
+    stats = pipeline.ingest_files([str(file_path)], "policies")
+
+    assert stats["reindexed"] == 1
+    with get_session_direct() as session:
+        documents = session.exec(select(DocumentDB)).all()
+    assert [document.source for document in documents] == [str(file_path)]
+
+    stored = collection_utils.get_collection("policies_hr").get(include=["metadatas"])
+    assert stored["ids"]
+    assert {metadata["doc_hash"] for metadata in stored["metadatas"]} == {documents[0].hash}
+    assert {metadata["source"] for metadata in stored["metadatas"]} == {str(file_path)}
+
+def test_reconcile_other_collection_keeps_documents(tmp_path, pipeline, collection_utils):
+    file_path = tmp_path / "Fake HR Policy Handbook.docx"
+    write_docx(file_path, policy_paragraphs(6))
+    pipeline.ingest_files([str(file_path)], "policies")
+    stored = collection_utils.get_collection("policies_hr").count()
+
+    other = pipeline.reconcile("other")
+    assert other["documents_dropped"] == 0
+    assert pipeline.reconcile("policies") == {
+        "repartitioned_chunks": 0, "orphan_chunks": 0, "documents_dropped": 0, "checkpoints_reset": 0
+    }
+    assert collection_utils.get_collection("policies_hr").count() == stored
+    with get_session_direct() as session:
+        assert [document.collection for document in session.exec(select(DocumentDB)).all()] == ["policies"]
+
+def handbook_paragraphs(edited_section=None):
+    """ Numbered sections of two paragraphs each, the first paragraph of `edited_section` reworded. """
+    paragraphs = []
+    for section in range(1, 7):
+        paragraphs.append(f"{section}. Policy Area {section}")
+        paragraphs.extend(
+            f"Rule {section}.{rule}. " + paragraph
+            for rule, paragraph in enumerate(policy_paragraphs(2), start=1)
+        )
+        if section == edited_section:
+            paragraphs[-2] = f"Rule {section}.1. Staff covered by area {section} submit every request to the HR helpdesk instead."
+    return paragraphs
+
+def test_single_paragraph_edit_only_reembeds_its_section(tmp_path, pipeline, collection_utils):
+    file_path = tmp_path / "Fake HR Policy Handbook.docx"
+    write_docx(file_path, handbook_paragraphs())
+    first = pipeline.ingest_files([str(file_path)], "policies")
+
+    embedder = collection_utils.sentence_transformer_ef
+    embedder.embedded.clear()
+    write_docx(file_path, handbook_paragraphs(edited_section=3))
+    stats = pipeline.ingest_files([str(file_path)], "policies")
+
+    stored = collection_utils.get_collection("policies_hr").get(include=["metadatas"])
+    edited_chunks = [metadata for metadata in stored["metadatas"] if metadata.get("section") == "3. Policy Area 3"]
+    assert stats["reindexed"] == 1
+    assert first["chunks"] >= 12
+    assert 0 < len(embedder.embedded) <= len(edited_chunks)
+
+def test_stopped_ingestion_resumes_from_committed_batches(tmp_path, pipeline, collection_utils):
+    file_path = tmp_path / "Fake HR Policy Handbook.docx"
+    write_docx(file_path, policy_paragraphs(24))
+
+    def committed_a_batch():
+        collection = collection_utils.get_collection("policies_hr")
+        return collection is not None and collection.count() > 0
+
+    first = pipeline.ingest_files([str(file_path)], "policies", should_stop=committed_a_batch)
+    assert first["batches"] == 1
+    assert first["documents"] == 0
+
+    second = pipeline.ingest_files([str(file_path)], "policies")
+    assert second["documents"] == 1
+
+    stored = collection_utils.get_collection("policies_hr").get()
+    assert len(stored["ids"]) == len(set(stored["ids"])) == first["chunks"] + second["chunks"]
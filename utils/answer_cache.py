@@ -0,0 +1,289 @@
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from config import (
+    ANSWER_CACHE_PATH, ANSWER_CACHE_SIMILARITY, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_DETAIL_TERMS, COLLECTION_CATEGORIES
+)
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+class SemanticAnswerCache:
+    """
+    Cache of answers to context-free policy questions, matched by domain, detail terms and query embedding.
+
+    Each entry stores the question embedding, the document summary and answer generated for it,
+    and the hashes of the documents its chunks were retrieved from. A new question of the same
+    domain whose cosine similarity to a cached question is at least `similarity_threshold` gets
+    the cached summary and answer. Entries are removed when any of their documents is deleted or
+    re-indexed, or when a new document is added to a domain they searched. They expire after
+    `ttl_seconds`, and the least recently used ones are evicted past `max_entries`.
+
+    Details such as "as an intern" versus "as an executive" barely move the embedding, so the
+    role and situation terms of a question (entries of `detail_terms` and any numbers) are part
+    of the key: a cached answer is only reused for a question with exactly the same terms.
+
+    Entries live in a SQLite file so ingestion runs in other processes can invalidate them.
+    Embeddings of each domain are kept in memory as one matrix and reloaded whenever the file
+    was changed by another connection.
+
+    Args:
+        cache_path (str): Path to the SQLite file backing the cache.
+        similarity_threshold (float): Minimum cosine similarity to reuse an answer.
+        max_entries (int): Maximum number of cached answers.
+        ttl_seconds (Optional[float]): Age after which an answer is no longer used. No expiry if None.
+        known_domains (Sequence[str]): Domains that are searched on their own. Answers of any other
+            domain searched every document.
+        detail_terms (Sequence[str]): Role and situation terms a cached answer must share with the question.
+    """
+
+    def __init__(
+        self,
+        cache_path: str,
+        similarity_threshold: float,
+        max_entries: int,
+        ttl_seconds: Optional[float],
+        known_domains: Sequence[str] = COLLECTION_CATEGORIES,
+        detail_terms: Sequence[str] = ANSWER_CACHE_DETAIL_TERMS
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.known_domains = set(known_domains)
+        # longest first so "senior executive" is not read as "executive", plurals count as the same term
+        terms = sorted({term.lower() for term in detail_terms}, key=len, reverse=True)
+        self._detail_pattern = re.compile(
+            r"\b(" + "|".join(re.escape(term) for term in terms) + r")(?:s|es)?\b|\d+(?:\.\d+)?"
+            if terms else r"\d+(?:\.\d+)?"
+        )
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, domain TEXT NOT NULL, details TEXT NOT NULL, question TEXT NOT NULL, "
+            "embedding BLOB NOT NULL, summary TEXT NOT NULL, answer TEXT NOT NULL, created_at REAL NOT NULL, "
+            "last_used REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)").fetchall()}
+        if "details" not in columns:
+            # answers cached without detail terms may belong to any role, start over
+            self._conn.execute("DELETE FROM answers")
+            self._conn.execute("ALTER TABLE answers ADD COLUMN details TEXT NOT NULL DEFAULT ''")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answer_documents ("
+            "answer_id INTEGER NOT NULL REFERENCES answers(id) ON DELETE CASCADE, doc_hash TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_answers_domain ON answers (domain, details)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_answer_documents_doc_hash ON answer_documents (doc_hash)")
+        self._conn.commit()
+        self._matrices: Dict[str, Any] = {}
+        self._data_version = None
+
+    @staticmethod
+    def _normalise(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def detail_key(self, question: str) -> str:
+        """ Sorted, comma separated role and situation terms and numbers of a question, plurals folded. """
+        return ",".join(sorted({
+            match.group(1) or match.group(0) for match in self._detail_pattern.finditer(question.lower())
+        }))
+
+    def _matrix(self, domain: str, details: str):
+        """ (ids, embeddings) of a domain and detail key, reloaded if any connection changed the file. Caller holds the lock. """
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._matrices.clear()
+            self._data_version = data_version
+
+        if (domain, details) not in self._matrices:
+            rows = self._conn.execute(
+                "SELECT id, embedding FROM answers WHERE domain = ? AND details = ?", (domain, details)
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            embeddings = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else None
+            self._matrices[(domain, details)] = (ids, embeddings)
+        return self._matrices[(domain, details)]
+
+    def lookup(self, embedding: Sequence[float], domain: str, question: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the cached answer of the most similar question in a domain with the same detail terms.
+
+        Args:
+            embedding (Sequence[float]): Embedding of the new question.
+            domain (str): Domain(s) the question was routed to.
+            question (str): The new question, its detail terms must match the cached question's.
+
+        Returns:
+            Optional[Dict[str, Any]]: question, summary, answer and similarity of the cached entry,
+                None if no cached question is similar enough.
+        """
+        query = self._normalise(embedding)
+        with self._lock:
+            ids, embeddings = self._matrix(domain, self.detail_key(question))
+            row = None
+            if embeddings is not None:
+                similarities = embeddings @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    row = self._conn.execute(
+                        "SELECT question, summary, answer, created_at FROM answers WHERE id = ?", (ids[best],)
+                    ).fetchone()
+
+            if row is None or (self.ttl_seconds is not None and time.time() - row[3] > self.ttl_seconds):
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), ids[best]))
+            self._conn.commit()
+            self.hits += 1
+
+        logger.info(f"Answer cache hit for domain '{domain}' with similarity {float(similarities[best]):.3f}.")
+        return {"question": row[0], "summary": row[1], "answer": row[2], "similarity": float(similarities[best])}
+
+    def put(
+        self,
+        embedding: Sequence[float],
+        domain: str,
+        question: str,
+        summary: str,
+        answer: str,
+        doc_hashes: List[str]
+    ) -> None:
+        """
+        Cache the summary and answer generated for a question.
+
+        Args:
+            embedding (Sequence[float]): Embedding of the question.
+            domain (str): Domain(s) the question was routed to.
+            question (str): The user's question.
+            summary (str): Summary of the retrieved documents.
+            answer (str): Answer returned to the user.
+            doc_hashes (List[str]): Hashes of the documents the answer was based on.
+
+        Returns:
+            None
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (domain, details, question, embedding, summary, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (domain, self.detail_key(question), question, self._normalise(embedding).tobytes(), summary, answer, now, now)
+            )
+            self._conn.executemany(
+                "INSERT INTO answer_documents (answer_id, doc_hash) VALUES (?, ?)",
+                [(cursor.lastrowid, doc_hash) for doc_hash in dict.fromkeys(doc_hashes)]
+            )
+            self._evict()
+            self._conn.commit()
+            self._matrices.clear()
+
+    def _evict(self) -> None:
+        """ Remove expired answers and least recently used ones above `max_entries`. Caller holds the lock. """
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Evicted {excess} answer(s) from cache.")
+
+    def invalidate_documents(self, doc_hashes: List[str]) -> int:
+        """
+        Remove every cached answer based on any of the given documents.
+
+        Args:
+            doc_hashes (List[str]): Hashes of documents that were deleted or re-indexed.
+
+        Returns:
+            int: Number of answers removed.
+        """
+        if not doc_hashes:
+            return 0
+        removed = 0
+        with self._lock:
+            # chunk IN lists to stay below SQLite's bound variable limit
+            for start in range(0, len(doc_hashes), 500):
+                batch = doc_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                removed += self._conn.execute(
+                    f"DELETE FROM answers WHERE id IN "
+                    f"(SELECT answer_id FROM answer_documents WHERE doc_hash IN ({placeholders}))",
+                    batch
+                ).rowcount
+            self._conn.commit()
+            self._matrices.clear()
+        if removed:
+            logger.info(f"Invalidated {removed} cached answer(s) of {len(doc_hashes)} changed document(s).")
+        return removed
+
+    def invalidate_domains(self, domains: Iterable[Optional[str]]) -> int:
+        """
+        Remove every cached answer that could have been based on documents newly added to the given domains.
+
+        That is every answer whose domain key names one of the domains, and every answer of an
+        unknown domain, since those searched all documents. A document without a domain (None)
+        only affects the latter.
+
+        Args:
+            domains (Iterable[Optional[str]]): Domains of the added documents.
+
+        Returns:
+            int: Number of answers removed.
+        """
+        targets = {domain for domain in domains if domain}
+        with self._lock:
+            rows = self._conn.execute("SELECT id, domain FROM answers").fetchall()
+            stale = [
+                answer_id for answer_id, key in rows
+                if any(part in targets or part not in self.known_domains for part in key.split(","))
+            ]
+            if not stale:
+                return 0
+            # chunk IN lists to stay below SQLite's bound variable limit
+            for start in range(0, len(stale), 500):
+                batch = stale[start:start + 500]
+                self._conn.execute(f"DELETE FROM answers WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._conn.commit()
+            self._matrices.clear()
+        logger.info(f"Invalidated {len(stale)} cached answer(s) of domains with new documents.")
+        return len(stale)
+
+    def clear(self) -> None:
+        """ Remove every cached answer. """
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._matrices.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """ Hit/miss counters of this process. """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+answer_cache = SemanticAnswerCache(
+    cache_path=ANSWER_CACHE_PATH,
+    similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+)
+
+__all__ = ["answer_cache", "SemanticAnswerCache"]
@@ -0,0 +1,217 @@
+import gzip
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+# keeps clause numbers such as "4.1" and short acronyms such as "mc" as single terms
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "for", "from", "how", "i",
+    "if", "in", "is", "it", "my", "of", "on", "or", "the", "to", "what", "when", "with",
+}
+
+def tokenize(text: str) -> List[str]:
+    """ Lowercase word/number terms of a text without stopwords. """
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists with reciprocal-rank fusion, score(id) = sum(1 / (k + rank)).
+
+    Args:
+        rankings (Sequence[Sequence[str]]): Ids of each ranking, best first.
+        k (int): Damping constant, larger values flatten the weight of top ranks.
+
+    Returns:
+        List[Tuple[str, float]]: Ids with fused score, best first.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """
+    In-process BM25 inverted index over chunk ids.
+
+    Term frequencies of each chunk are persisted as gzipped JSON and the postings are rebuilt
+    when the file is loaded. The file is reloaded if another process (e.g. the ingestion CLI)
+    rewrote it since it was last read.
+
+    Every add/remove/clear saves the file, except inside `deferred_save`, where changes are
+    kept in memory and written once when the outermost block exits.
+
+    Args:
+        index_path (str): Path to the gzipped JSON file backing the index.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalisation.
+    """
+
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75):
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._docs: Dict[str, Dict] = {}  # chunk_id -> {"category": str, "tf": {term: count}, "length": int}
+        self._postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._total_length = 0
+        self._loaded_mtime: Optional[float] = None
+        self._dirty = False
+        self._save_depth = 0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def _load(self) -> None:
+        """ Read the index file if it exists and changed since last read. Caller may hold the lock. """
+        if self._dirty:
+            # unsaved changes are newer than the file
+            return
+        try:
+            mtime = os.path.getmtime(self.index_path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+
+        try:
+            with gzip.open(self.index_path, "rt", encoding="utf-8") as f:
+                docs = json.load(f)
+        except Exception as e:
+            logger.warning(f"Unable to load BM25 index from {self.index_path}: {e}")
+            return
+
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, defaultdict(dict), 0
+            for chunk_id, doc in docs.items():
+                self._index(chunk_id, doc)
+            self._loaded_mtime = mtime
+        logger.info(f"Loaded BM25 index with {len(self._docs)} chunk(s) from {self.index_path}.")
+
+    def _index(self, chunk_id: str, doc: Dict) -> None:
+        """ Add a chunk's term frequencies to the postings. Caller holds the lock. """
+        self._docs[chunk_id] = doc
+        self._total_length += doc["length"]
+        for term, count in doc["tf"].items():
+            self._postings[term][chunk_id] = count
+
+    def _unindex(self, chunk_id: str) -> None:
+        """ Remove a chunk from the postings. Caller holds the lock. """
+        doc = self._docs.pop(chunk_id, None)
+        if doc is None:
+            return
+        self._total_length -= doc["length"]
+        for term in doc["tf"]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def save(self) -> None:
+        """ Atomically write the index to disk. """
+        with self._lock:
+            os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump(self._docs, f, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+            self._loaded_mtime = os.path.getmtime(self.index_path)
+            self._dirty = False
+
+    def _changed(self) -> None:
+        """ Save after a change unless saves are deferred. Caller holds the lock. """
+        self._dirty = True
+        if self._save_depth == 0:
+            self.save()
+
+    @contextmanager
+    def deferred_save(self) -> Iterator["BM25Index"]:
+        """ Keep changes in memory inside the block and save once when the outermost block exits. """
+        with self._lock:
+            self._save_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._save_depth -= 1
+                if self._save_depth == 0 and self._dirty:
+                    self.save()
+
+    def add(self, chunk_ids: Sequence[str], texts: Sequence[str], categories: Sequence[Optional[str]]) -> None:
+        """
+        Index chunks, replacing chunks with the same id.
+
+        Args:
+            chunk_ids (Sequence[str]): Ids of chunks, same as in the vector store.
+            texts (Sequence[str]): Chunk texts.
+            categories (Sequence[Optional[str]]): Category of each chunk.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._load()
+            for chunk_id, text, category in zip(chunk_ids, texts, categories):
+                self._unindex(chunk_id)
+                terms = tokenize(text)
+                self._index(chunk_id, {"category": category, "tf": dict(Counter(terms)), "length": len(terms)})
+            self._changed()
+
+    def remove(self, chunk_ids: Sequence[str]) -> None:
+        """ Remove chunks from the index. """
+        with self._lock:
+            self._load()
+            for chunk_id in chunk_ids:
+                self._unindex(chunk_id)
+            self._changed()
+
+    def clear(self) -> None:
+        """ Remove every chunk from the index. """
+        with self._lock:
+            self._docs, self._postings, self._total_length = {}, defaultdict(dict), 0
+            self._changed()
+
+    def search(self, query: str, n_results: int, category: Optional[str] = None) -> List[Tuple[str, float]]:
+        """
+        Score chunks against a query with BM25.
+
+        Args:
+            query (str): Query text.
+            n_results (int): Number of chunk ids to return.
+            category (Optional[str]): Only return chunks of this category if given.
+
+        Returns:
+            List[Tuple[str, float]]: Chunk ids with BM25 score, best first.
+        """
+        with self._lock:
+            self._load()
+            n_docs = len(self._docs)
+            if n_docs == 0:
+                return []
+            avg_length = self._total_length / n_docs
+
+            scores: Dict[str, float] = defaultdict(float)
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for chunk_id, tf in postings.items():
+                    doc = self._docs[chunk_id]
+                    if category is not None and doc["category"] != category:
+                        continue
+                    norm = tf + self.k1 * (1 - self.b + self.b * doc["length"] / avg_length)
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / norm
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:n_results]
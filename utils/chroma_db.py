@@ -1,25 +1,152 @@
 import os
+import threading
+import time
+from functools import lru_cache
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from logger import get_logger
-from config import EMBED_MODEL_PATH, CHROMA_DB_DIR, CHUNK_SIZE, CHUNK_OVERLAP
+from config import (
+    EMBED_MODEL_PATH, CHROMA_DB_DIR, CHUNK_SIZE, CHUNK_OVERLAP,
+    CHUNK_MODE, CHUNK_TOKEN_SIZE, CHUNK_TOKEN_OVERLAP,
+    EMBED_CACHE_PATH, EMBED_CACHE_MAX_ENTRIES, EMBED_BATCH_SIZE, EMBED_NUM_THREADS,
+    EMBED_BACKEND, EMBED_ONNX_QUANTIZATION, BM25_INDEX_DIR, HYBRID_CANDIDATES, RRF_K,
+    VECTOR_BACKEND, FLAT_INDEX_DIR, FLAT_INDEX_DTYPE, COLLECTION_CATEGORIES, PARTITION_BY_CATEGORY
+)
 from sqlmodel import Field, Session, select
+from sqlalchemy import insert, delete
 from database import get_session_direct
-from exceptions import CollectionNotFoundException, ChunkIDInvalidException, MetadataUpdateException
-from models import DocumentDB
-from typing import List, Dict, Optional, Any, Tuple
+from exceptions import CollectionNotFoundException, ChunkIDInvalidException, MetadataUpdateException, IngestionBatchException
+from models import DocumentDB, FileFingerprintDB, ChunkDB
+from utils import sg_datetime
+from utils.embedding_cache import EmbeddingCache
+from utils.bm25_index import BM25Index, reciprocal_rank_fusion
+from utils.flat_index import FlatClient
+from utils.answer_cache import answer_cache
+from utils.document_loaders import FILE_LOADERS, HEADING_PATTERN, load_file
+from typing import List, Dict, Optional, Any, Tuple, Iterator, Union
 import hashlib
 from langchain.schema import Document
 from langchain_community.document_loaders import PyPDFLoader, PyPDFDirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
+from transformers import AutoTokenizer
 import chromadb
 from chromadb.utils import embedding_functions
 from chromadb.api.models.Collection import Collection
 
 logger = get_logger(__name__)
 
+# stay below SQLite's limit on bound variables per statement
+SQL_IN_BATCH_SIZE = 500
+
+def existing_document_hashes(session: Session, hashes: List[str]) -> set:
+    """
+    Return the subset of hashes already stored in DocumentDB using chunked IN queries.
+
+    Args:
+        session (Session): Open database session.
+        hashes (List[str]): Document hashes to check.
+
+    Returns:
+        set: Hashes found in DocumentDB.
+    """
+    unique_hashes = list(dict.fromkeys(hashes))
+    found = set()
+    for start in range(0, len(unique_hashes), SQL_IN_BATCH_SIZE):
+        batch = unique_hashes[start:start + SQL_IN_BATCH_SIZE]
+        statement = select(DocumentDB.hash).where(DocumentDB.hash.in_(batch))
+        found.update(session.exec(statement).all())
+    return found
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_path: str):
+    """ Load and cache the tokenizer of a local model. Returns None if it cannot be loaded. """
+    try:
+        return AutoTokenizer.from_pretrained(model_path)
+    except Exception as e:
+        logger.warning(f"Unable to load tokenizer from {model_path}, falling back to word counts: {e}")
+        return None
+
+def embedding_backend_kwargs(backend: str, quantization: str = EMBED_ONNX_QUANTIZATION) -> Dict[str, Any]:
+    """
+    SentenceTransformer keyword arguments selecting an embedding backend.
+
+    Args:
+        backend (str): "torch", "onnx" or "onnx-int8".
+        quantization (str): Quantization config the int8 model was exported with.
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for SentenceTransformer.
+    """
+    if backend == "torch":
+        return {}
+    if backend == "onnx":
+        return {"backend": "onnx", "model_kwargs": {"file_name": "onnx/model.onnx"}}
+    if backend == "onnx-int8":
+        return {"backend": "onnx", "model_kwargs": {"file_name": f"onnx/model_qint8_{quantization}.onnx"}}
+    raise ValueError(f"Unknown embedding backend '{backend}'.")
+
+def count_tokens(texts: List[str], model_path: str = EMBED_MODEL_PATH) -> List[int]:
+    """
+    Count tokens of each text with the tokenizer of the embedding model.
+
+    Args:
+        texts (List[str]): Texts to count.
+        model_path (str): Path to the model whose tokenizer is used.
+
+    Returns:
+        List[int]: Token count of each text, including special tokens.
+    """
+    if not texts:
+        return []
+    tokenizer = get_tokenizer(model_path)
+    if tokenizer is None:
+        return [len(text.split()) for text in texts]
+    return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=True)["input_ids"]]
+
+def file_md5(file_path: str, block_size: int = 1 << 20) -> str:
+    """ MD5 of the raw bytes of a file, read in blocks. """
+    md5 = hashlib.md5()
+    with open(file_path, "rb") as f:
+        while block := f.read(block_size):
+            md5.update(block)
+    return md5.hexdigest()
+
 # ====================
 # chunking utils
 # ====================
+def detect_section_offsets(text: str) -> List[List]:
+    """
+    Find numbered heading lines in extracted text.
+
+    Args:
+        text (str): Document text.
+
+    Returns:
+        List[List]: [char offset, heading] pairs in document order.
+    """
+    section_offsets = []
+    offset = 0
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if HEADING_PATTERN.match(stripped):
+            section_offsets.append([offset + line.index(stripped), stripped])
+        offset += len(line) + 1
+    return section_offsets
+
+def list_source_files(dir_path: str, extensions: Tuple[str, ...] = tuple(FILE_LOADERS)) -> List[str]:
+    """ Recursively list absolute paths of files with the given extensions in a directory in a stable order. """
+    source_files = []
+    for root, _, files in os.walk(os.path.abspath(dir_path)):
+        for name in files:
+            if name.lower().endswith(extensions):
+                source_files.append(os.path.join(root, name))
+    return sorted(source_files)
+
+def list_pdf_files(dir_path: str) -> List[str]:
+    """ Recursively list pdf files in a directory in a stable order. """
+    return list_source_files(dir_path, extensions=(".pdf",))
+
 class ChunkingUtils:
     """
     Utility class for splitting text documents into chunks before storing in ChromaDB.
@@ -28,53 +155,168 @@ class ChunkingUtils:
     applied to PDF or plain text content to produce overlapping text chunks
     suitable for embedding and storage.
 
+    In "tokens" mode chunk length is measured with the embedding model's tokenizer,
+    so chunks fill but never exceed the model's sequence length.
+
+    In both modes documents are split section by section, so no chunk crosses a heading
+    and editing one section leaves the chunks of every other section unchanged.
+
     Args:
         chunk_size (int): Maximum size of each text chunk before embedding.
-        chunk_overlap (int): Number of overlapping characters between text chunks.
+        chunk_overlap (int): Number of overlapping characters (or tokens) between text chunks.
+        chunk_mode (str): "characters" or "tokens".
+        tokenizer_path (str): Model whose tokenizer measures chunks in "tokens" mode.
     """
 
-    def __init__(self, chunk_size: int, chunk_overlap: int): 
-        self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap
-        )
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        chunk_mode: str = "characters",
+        tokenizer_path: str = EMBED_MODEL_PATH
+    ): 
+        self.chunk_mode = chunk_mode
+        self.tokenizer_path = tokenizer_path
+        tokenizer = get_tokenizer(tokenizer_path) if chunk_mode == "tokens" else None
+
+        if chunk_mode == "tokens" and tokenizer is not None:
+            self.splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+                tokenizer,
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                add_start_index=True
+            )
+        elif chunk_mode in ("characters", "tokens"):
+            if chunk_mode == "tokens":
+                logger.warning("Tokenizer unavailable, chunking by characters instead.")
+                self.chunk_mode = "characters"
+            self.splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                add_start_index=True
+            )
+        else:
+            raise ValueError(f"Unknown chunk mode '{chunk_mode}'.")
+
+    def iter_files_to_document(
+        self,
+        file_paths: List[str],
+        max_workers: Optional[int] = None
+    ) -> Iterator[Document]:
+        """
+        Lazily convert pdf or docx files at specific paths into langchain Documents.
+
+        With `max_workers` above 1 the files are parsed in a process pool and Documents are
+        yielded as each file completes, so the order may differ from `file_paths`. At most
+        2 * max_workers files are in flight, so a slow consumer holds back parsing.
+        A file that fails to load is logged and skipped.
+
+        Args:
+            file_paths (List[str]): A list of file paths to PDF or DOCX documents.
+            max_workers (Optional[int]): Number of worker processes. Loads sequentially if None or 1.
+
+        Yields:
+            Document: file in format of langchain document
+        """
+        logger.info(f"{len(file_paths)} document(s) to load")
+
+        if not max_workers or max_workers <= 1:
+            for file_path in file_paths:
+                _, documents, error = load_file(file_path)
+                if error:
+                    logger.error(f"Failed to process {file_path}: {error}")
+                    continue
+                logger.info(f"Loaded document from {file_path}")
+                yield from documents
+            return
+
+        pending_files = iter(file_paths)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = set()
+            for file_path in pending_files:
+                in_flight.add(executor.submit(load_file, file_path))
+                if len(in_flight) >= 2 * max_workers:
+                    break
+
+            while in_flight:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    next_file = next(pending_files, None)
+                    if next_file is not None:
+                        in_flight.add(executor.submit(load_file, next_file))
+
+                    try:
+                        file_path, documents, error = future.result()
+                    except Exception as e:
+                        logger.error(f"Worker failed to process document: {e}")
+                        continue
+
+                    if error:
+                        logger.error(f"Failed to process {file_path}: {error}")
+                        continue
+                    logger.info(f"Loaded document from {file_path}")
+                    yield from documents
+
+    def iter_pdfs_to_document(
+        self,
+        pdf_files: List[str],
+        max_workers: Optional[int] = None
+    ) -> Iterator[Document]:
+        """
+        Lazily convert pdfs at specific paths into langchain Documents. See `iter_files_to_document`.
+
+        Args:
+            pdf_files (List[str]): A list of file paths to PDF documents.
+            max_workers (Optional[int]): Number of worker processes. Loads sequentially if None or 1.
+
+        Yields:
+            Document: pdf file in format of langchain document
+        """
+        yield from self.iter_files_to_document(pdf_files, max_workers=max_workers)
 
-    def path_pdfs_to_document(self, pdf_files: List[str]) -> List[Document]:
+    def path_docx_to_document(self, docx_files: List[str], max_workers: Optional[int] = None) -> List[Document]:
+        """
+        Convert Word documents at specific paths into langchain Documents.
+
+        Args:
+            docx_files (List[str]): A list of file paths to DOCX documents.
+            max_workers (Optional[int]): Number of worker processes. Loads sequentially if None or 1.
+
+        Returns:
+            all_documents (List[Document]): list of docx files in format of langchain document
+        """
+        return list(self.iter_files_to_document(docx_files, max_workers=max_workers))
+
+    def path_pdfs_to_document(self, pdf_files: List[str], max_workers: Optional[int] = None) -> List[Document]:
         """
         Convert pdfs at specific paths into langchain Documents.
 
         Args:
             pdf_files (List[str]): A list of file paths to PDF documents.
+            max_workers (Optional[int]): Number of worker processes. Loads sequentially if None or 1.
         
         Returns:
             all_documents (List[Document]): list of pdf files in format of langchain document
         """
+        return list(self.iter_pdfs_to_document(pdf_files, max_workers=max_workers))
 
-        logger.info(f"{len(pdf_files)} document(s) to load")
-        all_documents = []
-
-        for file_path in pdf_files:
-            try:
-                loader = PyPDFLoader(file_path, mode="single")
-                documents = loader.load()
-                all_documents.extend(documents)
-                logger.info(f"Loaded pdf from {file_path}")
-            except Exception as e:
-                logger.error(f"Failed to process {file_path}: {e}")
-
-        return all_documents
-
-    def dir_pdfs_to_document(self, dir_path: str) -> List[Document]:
+    def dir_pdfs_to_document(self, dir_path: str, max_workers: Optional[int] = None) -> List[Document]:
         """
         Convert all pdfs in a directory into langchain Documents
 
         Args:
             dir_path (str): Path to the directory containing PDF files.
+            max_workers (Optional[int]): Number of worker processes. Uses PyPDFDirectoryLoader if None or 1.
         
         Returns:
         all_documents (List[Document]): list of pdf files in format of langchain document
 
         """
+        if max_workers and max_workers > 1:
+            all_documents = self.path_pdfs_to_document(list_pdf_files(dir_path), max_workers=max_workers)
+            logger.info(f"{len(all_documents)} documents loaded from directory: {dir_path}")
+            return all_documents
+
         try:
             # glob for pattern matching, recursive to search subdirectories
             loader = PyPDFDirectoryLoader(dir_path, mode="single", glob="*.pdf", recursive=True)
@@ -85,6 +327,86 @@ class ChunkingUtils:
             logger.error(f"Failed to process PDFs in directory {dir_path}: {e}")
             return []
 
+    def filter_changed_files(self, file_paths: List[str]) -> Tuple[List[str], Dict[str, Dict[str, Any]]]:
+        """
+        Filter out files unchanged since they were last ingested, before any parsing.
+
+        A file is unchanged if its size and mtime match its FileFingerprintDB row, or if they
+        differ but the MD5 of its bytes still matches (the mtime is refreshed in that case).
+        Paths are made absolute first, so the same file is matched however it was passed in,
+        and the returned paths become the `source` of the loaded documents.
+
+        Args:
+            file_paths (List[str]): Paths of files to check.
+
+        Returns:
+            changed_files (List[str]): Absolute paths that are new or whose bytes changed.
+            fingerprints (Dict[str, Dict[str, Any]]): Fingerprint of each changed file, to be
+                saved with `record_file_fingerprints` once the file is ingested.
+        """
+        file_paths = list(dict.fromkeys(os.path.abspath(file_path) for file_path in file_paths))
+        with get_session_direct() as session:
+            known = {}
+            for start in range(0, len(file_paths), SQL_IN_BATCH_SIZE):
+                batch = file_paths[start:start + SQL_IN_BATCH_SIZE]
+                statement = select(FileFingerprintDB).where(FileFingerprintDB.path.in_(batch))
+                known.update({record.path: record for record in session.exec(statement).all()})
+
+            changed_files, fingerprints = [], {}
+            touched = 0
+            for file_path in file_paths:
+                try:
+                    stat = os.stat(file_path)
+                except OSError as e:
+                    logger.error(f"Failed to stat {file_path}: {e}")
+                    continue
+
+                record = known.get(file_path)
+                if record and record.size == stat.st_size and record.mtime == stat.st_mtime:
+                    continue
+
+                file_hash = file_md5(file_path)
+                if record and record.file_hash == file_hash:
+                    record.size, record.mtime = stat.st_size, stat.st_mtime
+                    record.modified_at = sg_datetime.get_sgt_time()
+                    session.add(record)
+                    touched += 1
+                    continue
+
+                changed_files.append(file_path)
+                fingerprints[file_path] = {
+                    "path": file_path,
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "file_hash": file_hash,
+                }
+            session.commit()
+
+        logger.info(f"{len(changed_files)} of {len(file_paths)} file(s) changed, {touched} touched but identical.")
+        return changed_files, fingerprints
+
+    def record_file_fingerprints(self, fingerprints: List[Dict[str, Any]]) -> None:
+        """
+        Save fingerprints of files that were ingested so they are skipped next time.
+
+        Args:
+            fingerprints (List[Dict[str, Any]]): Fingerprints from `filter_changed_files`.
+
+        Returns:
+            None
+        """
+        if not fingerprints:
+            return
+
+        modified_at = sg_datetime.get_sgt_time()
+        records = [
+            {**fingerprint, "path": os.path.abspath(fingerprint["path"]), "modified_at": modified_at}
+            for fingerprint in fingerprints
+        ]
+        with get_session_direct() as session:
+            session.execute(insert(FileFingerprintDB).prefix_with("OR REPLACE"), records)
+            session.commit()
+
     def filter_new_documents(
         self,
         all_documents: List[Document], 
@@ -101,29 +423,35 @@ class ChunkingUtils:
             new_sources (List[str]): Corresponding source paths from metadata.
         """
         new_docs, new_hashes, new_sources  = [], [], []
-        with get_session_direct() as session:
-            for doc in all_documents:
-                # Hash based on document text
-                text = doc.page_content
-                hash_val = hashlib.md5(text.encode("utf-8")).hexdigest()
 
-                # Check for existing hash
-                statement = select(DocumentDB).where(DocumentDB.hash == hash_val)
-                result = session.exec(statement).first()
+        # Hash based on document text
+        all_hashes = [hashlib.md5(doc.page_content.encode("utf-8")).hexdigest() for doc in all_documents]
+
+        # Check for existing hashes in a handful of queries
+        with get_session_direct() as session:
+            seen = existing_document_hashes(session, all_hashes)
 
-                if not result:  # new doc → save and keep
-                    source = doc.metadata.get("source", "unknown")
+        for doc, hash_val in zip(all_documents, all_hashes):
+            if hash_val in seen:
+                continue
+            seen.add(hash_val) # duplicates within this batch are only kept once
 
-                    doc.metadata["doc_hash"] = hash_val # Attach hash into metadata
-                    new_docs.append(doc)
-                    new_hashes.append(hash_val)
-                    new_sources.append(source)
+            source = doc.metadata.get("source", "unknown")
+            doc.metadata["doc_hash"] = hash_val # Attach hash into metadata
+            new_docs.append(doc)
+            new_hashes.append(hash_val)
+            new_sources.append(source)
 
         return new_docs, new_hashes, new_sources
     
     def split_documents(self, all_documents: List[Document]) -> List[Document]:
         """
-        Split pdf documents extracted to chunks.
+        Split pdf or docx documents extracted to chunks, each section separately. Sections start
+        at the `section_offsets` headings provided by the loader, or at numbered headings detected
+        in the text, and each chunk gets the heading of its section as `section`. Splitting is
+        greedy within a section, so an edit that changes the length of a section moves every
+        later chunk of that section, but none of other sections. A document without headings
+        is one section. Every chunk gets its `token_count`.
 
         Args: 
             all_documents (List[Document]): list of pdf files in format of langchain document
@@ -131,10 +459,40 @@ class ChunkingUtils:
         Returns:
             all_chunks (List[Document]): A list of document chunks extracted from all PDFs.
         """
-        all_chunks = self.splitter.split_documents(all_documents)
+        all_chunks = []
+        for doc in all_documents:
+            section_offsets = doc.metadata.pop("section_offsets", None)
+            chunks = self._split_by_section(doc, section_offsets or detect_section_offsets(doc.page_content))
+            all_chunks.extend(chunks)
+
+        token_counts = count_tokens([chunk.page_content for chunk in all_chunks], self.tokenizer_path)
+        for chunk, token_count in zip(all_chunks, token_counts):
+            chunk.metadata["token_count"] = token_count
+
         logger.info(f"Total chunks created: {len(all_chunks)}")
         return all_chunks
 
+    def _split_by_section(self, doc: Document, section_offsets: List[List]) -> List[Document]:
+        """ Split each section of a document on its own so chunks never span two sections. """
+        bounds = [[0, None]] + [pair for pair in section_offsets if pair[0] > 0]
+        if section_offsets and section_offsets[0][0] == 0:
+            bounds[0] = section_offsets[0]
+
+        chunks = []
+        for i, (start, heading) in enumerate(bounds):
+            end = bounds[i + 1][0] if i + 1 < len(bounds) else len(doc.page_content)
+            text = doc.page_content[start:end]
+            if not text.strip():
+                continue
+
+            section_chunks = self.splitter.split_documents([Document(page_content=text, metadata=dict(doc.metadata))])
+            for chunk in section_chunks:
+                chunk.metadata["start_index"] = start + chunk.metadata.get("start_index", 0)
+                if heading:
+                    chunk.metadata["section"] = heading
+            chunks.extend(section_chunks)
+        return chunks
+
     def add_metadata_new_chunks(self, chunks:List[Document], keys_to_add:Dict) -> List[Document]:
         """
         Add/modify specific metadata keys to a list of new Document objects.
@@ -182,19 +540,306 @@ class CollectionUtils:
     for operations like creating collections, inserting chunks,
     updating metadata, and running queries.
 
+    The client, embedding function and any collection handles fetched through
+    `get_collection` are opened once and shared across requests and threads.
+    Handles are dropped whenever a collection is created, deleted or the db is
+    reset so that the next lookup reconnects to the rebuilt collection.
+
+    Chunk and query embeddings are computed through `embed_texts`, which reuses
+    vectors from a persistent EmbeddingCache when one is configured.
+
+    With `vector_backend="flat"` collections are FlatCollections, memory-mapped
+    `.npy` matrices searched exactly with NumPy, instead of Chroma collections.
+    They expose the same collection methods so the rest of this class is unchanged.
+
+    With `partition_by_category` every category is stored in its own collection,
+    "<collection_name>_<category>", so a query on one category searches only that
+    category's index instead of filtering a shared one. Chunks without a known
+    category stay in the base collection.
+
     Args:
         chroma_db_dir (str): Path to the directory where ChromaDB will persist data.
         embed_model_path (str): Path or model name for the SentenceTransformer embedding model.
+        embed_cache_path (Optional[str]): Path to the embedding cache file. Caching is disabled if None.
+        embed_cache_max_entries (int): Maximum number of embeddings kept in the cache.
+        embed_batch_size (int): Number of texts sent to the embedding model per batch.
+        embed_num_threads (Optional[int]): Torch intra-op threads used for embedding. Torch default if None.
+        embed_backend (str): "torch", or "onnx"/"onnx-int8" to run an exported model with ONNX Runtime.
+        sparse_index_dir (Optional[str]): Directory of per-collection BM25 indexes kept in sync with
+            the collections. Sparse indexing is disabled if None.
+        vector_backend (str): "chroma", or "flat" to store collections as memory-mapped NumPy matrices.
+        flat_index_dir (Optional[str]): Directory of the flat collections. Defaults to `chroma_db_dir`.
+        flat_index_dtype (str): "float32" or "float16" storage of embeddings in flat collections.
+        partition_by_category (bool): Store each category in its own collection.
+        categories (List[str]): Categories that get a partition.
     """
     def __init__(
         self, 
         chroma_db_dir: str,
         embed_model_path: str,
+        embed_cache_path: Optional[str] = None,
+        embed_cache_max_entries: int = EMBED_CACHE_MAX_ENTRIES,
+        embed_batch_size: int = EMBED_BATCH_SIZE,
+        embed_num_threads: Optional[int] = EMBED_NUM_THREADS,
+        embed_backend: str = EMBED_BACKEND,
+        sparse_index_dir: Optional[str] = None,
+        vector_backend: str = VECTOR_BACKEND,
+        flat_index_dir: Optional[str] = None,
+        flat_index_dtype: str = FLAT_INDEX_DTYPE,
+        partition_by_category: bool = PARTITION_BY_CATEGORY,
+        categories: List[str] = COLLECTION_CATEGORIES,
     ):
-        self.client = chromadb.PersistentClient(path=chroma_db_dir)
+        self.embed_model_path = embed_model_path
+        self.embed_batch_size = embed_batch_size
+        self.last_embed_rate = 0.0
+        if embed_num_threads:
+            import torch
+            torch.set_num_threads(embed_num_threads)
+
+        if vector_backend == "flat":
+            self.client = FlatClient(path=flat_index_dir or chroma_db_dir, dtype=flat_index_dtype)
+        else:
+            self.client = chromadb.PersistentClient(path=chroma_db_dir)
+        logger.info(f"Using '{vector_backend}' vector backend.")
         self.sentence_transformer_ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-            model_name=embed_model_path
+            model_name=embed_model_path,
+            **embedding_backend_kwargs(embed_backend)
         )
+        logger.info(f"Embedding model '{embed_model_path}' loaded with '{embed_backend}' backend.")
+        self.embedding_cache = None
+        if embed_cache_path:
+            # backends produce slightly different vectors, keep their cache entries apart
+            model_id = os.path.basename(os.path.normpath(embed_model_path))
+            if embed_backend != "torch":
+                model_id = f"{model_id}:{embed_backend}"
+            self.embedding_cache = EmbeddingCache(
+                cache_path=embed_cache_path,
+                model_id=model_id,
+                max_entries=embed_cache_max_entries
+            )
+        self._collections: Dict[str, Collection] = {}
+        self._lock = threading.RLock()
+        self.sparse_index_dir = sparse_index_dir
+        self._sparse_indexes: Dict[str, BM25Index] = {}
+        self._deferred_stack: Optional[ExitStack] = None
+        self._deferred_names: set = set()
+        self._deferred_collections: set = set()
+        self.partition_by_category = partition_by_category
+        self.categories = list(categories)
+
+    def match_category(self, category: Optional[str]) -> Optional[str]:
+        """ Entry of `categories` matching a category case-insensitively, None if unknown. """
+        if not category:
+            return None
+        return next((known for known in self.categories if known.lower() == category.strip().lower()), None)
+
+    def partition_name(self, collection_name: str, category: Optional[str]) -> str:
+        """
+        Name of the collection that stores chunks of a category.
+
+        Args:
+            collection_name (str): Base collection name, e.g. "policies".
+            category (Optional[str]): Category of the chunks.
+
+        Returns:
+            str: "<collection_name>_<category>" if partitioning and the category is known,
+                otherwise the base collection name.
+        """
+        known = self.match_category(category)
+        if self.partition_by_category and known:
+            return f"{collection_name}_{known.lower()}"
+        return collection_name
+
+    def partition_names(self, collection_name: str) -> List[str]:
+        """ Base collection followed by the partition of every category. """
+        if not self.partition_by_category:
+            return [collection_name]
+        return [collection_name] + [self.partition_name(collection_name, category) for category in self.categories]
+
+    def get_sparse_index(self, collection_name: str) -> Optional[BM25Index]:
+        """
+        Get the BM25 index kept alongside a collection.
+
+        Args:
+            collection_name (str): Name of the collection.
+
+        Returns:
+            Optional[BM25Index]: The index, None if sparse indexing is disabled.
+        """
+        if not self.sparse_index_dir:
+            return None
+        with self._lock:
+            index = self._sparse_indexes.get(collection_name)
+            if index is None:
+                index = BM25Index(os.path.join(self.sparse_index_dir, f"{collection_name}.json.gz"))
+                self._sparse_indexes[collection_name] = index
+            return index
+
+    @contextmanager
+    def deferred_saves(self, collection_names: List[str]) -> Iterator[None]:
+        """
+        Save the BM25 indexes and flat collections of collections once when the outermost block
+        exits instead of on every change. A flat collection is deferred from its first use inside
+        the block, so partitions created by the block are covered too. Chroma collections are
+        written as usual.
+
+        Args:
+            collection_names (List[str]): Collections written in the block.
+        """
+        with self._lock:
+            outermost = self._deferred_stack is None
+            if outermost:
+                self._deferred_stack = ExitStack()
+            stack = self._deferred_stack
+            names = [name for name in dict.fromkeys(collection_names) if name not in self._deferred_names]
+            self._deferred_names.update(names)
+        try:
+            for name in names:
+                if (index := self.get_sparse_index(name)) is not None:
+                    stack.enter_context(index.deferred_save())
+                with self._lock:
+                    collection = self._collections.get(name)
+                if collection is not None:
+                    self._defer_collection_saves(name, collection)
+            yield
+        finally:
+            if outermost:
+                with self._lock:
+                    self._deferred_stack = None
+                    self._deferred_names = set()
+                    self._deferred_collections = set()
+                stack.close()
+
+    def _defer_collection_saves(self, collection_name: str, collection: Collection) -> None:
+        """ Defer saves of a flat collection used inside `deferred_saves`. """
+        with self._lock:
+            if (
+                self._deferred_stack is None
+                or collection_name not in self._deferred_names
+                or collection_name in self._deferred_collections
+                or not hasattr(collection, "deferred_save")
+            ):
+                return
+            self._deferred_collections.add(collection_name)
+            self._deferred_stack.enter_context(collection.deferred_save())
+
+    def rebuild_sparse_index(self, collection_name: str) -> int:
+        """
+        Rebuild the BM25 index of a collection from the chunks stored in it.
+
+        Args:
+            collection_name (str): Name of the collection.
+
+        Returns:
+            int: Number of chunks indexed.
+        """
+        collection = self.get_collection(collection_name)
+        index = self.get_sparse_index(collection_name)
+        if collection is None:
+            raise CollectionNotFoundException(collection_name)
+        if index is None:
+            return 0
+
+        page_size, offset, total = 1000, 0, 0
+        with index.deferred_save():
+            index.clear()
+            while True:
+                page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                index.add(
+                    page["ids"],
+                    page["documents"],
+                    [(metadata or {}).get("category") for metadata in page["metadatas"]]
+                )
+                total += len(page["ids"])
+                if len(page["ids"]) < page_size:
+                    break
+                offset += page_size
+        logger.info(f"Rebuilt BM25 index of '{collection_name}' with {total} chunk(s).")
+        return total
+
+    def invalidate_collection(self, collection_name: Optional[str] = None) -> None:
+        """
+        Drop cached collection handle(s) so the next lookup reconnects
+
+        Args:
+            collection_name (Optional[str]): Name of collection to drop. Drops all handles if None.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            if collection_name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection_name, None)
+
+    def encode_batched(self, texts: List[str]) -> List[List[float]]:
+        """
+        Run the embedding model over texts in batches of similar token length.
+
+        Texts are sorted by token count so each batch pads to roughly the same length,
+        embedded `embed_batch_size` at a time, and returned in the original order.
+        Throughput is kept in `last_embed_rate` (chunks/sec), and logged at INFO for calls of at
+        least one full batch. Smaller calls, such as the query embedding of every chat turn, log at DEBUG.
+
+        Args:
+            texts (List[str]): Texts to embed.
+
+        Returns:
+            embeddings (List[List[float]]): One embedding per text, in input order.
+        """
+        if not texts:
+            return []
+
+        start_time = time.perf_counter()
+        if len(texts) <= self.embed_batch_size:
+            embeddings = list(self.sentence_transformer_ef(texts))
+        else:
+            lengths = count_tokens(texts, self.embed_model_path)
+            order = sorted(range(len(texts)), key=lambda i: lengths[i])
+            embeddings = [None] * len(texts)
+            for start in range(0, len(order), self.embed_batch_size):
+                batch_idx = order[start:start + self.embed_batch_size]
+                vectors = self.sentence_transformer_ef([texts[i] for i in batch_idx])
+                for i, vector in zip(batch_idx, vectors):
+                    embeddings[i] = vector
+
+        elapsed = time.perf_counter() - start_time
+        self.last_embed_rate = len(texts) / elapsed if elapsed > 0 else 0.0
+        log = logger.info if len(texts) >= self.embed_batch_size else logger.debug
+        log(f"Embedded {len(texts)} chunk(s) in {elapsed:.2f}s ({self.last_embed_rate:.1f} chunks/sec).")
+        return embeddings
+
+    def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, only running the embedding model on texts missing from the cache.
+
+        Args:
+            texts (List[str]): Chunk or query texts to embed.
+
+        Returns:
+            embeddings (List[List[float]]): One embedding per text, in input order.
+        """
+        if not texts:
+            return []
+
+        if self.embedding_cache is None:
+            return [list(map(float, vector)) for vector in self.encode_batched(texts)]
+
+        cached = self.embedding_cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, cached) if vector is None))
+
+        computed = {}
+        if missing:
+            vectors = self.encode_batched(missing)
+            self.embedding_cache.put_many(missing, vectors)
+            computed = dict(zip(missing, vectors))
+        logger.debug(f"Embedded {len(missing)} of {len(texts)} text(s), rest served from cache.")
+
+        return [
+            list(map(float, vector if vector is not None else computed[text]))
+            for text, vector in zip(texts, cached)
+        ]
 
     def create_collection(self, collection_name:str) -> None:
         """
@@ -211,6 +856,8 @@ class CollectionUtils:
                 name=collection_name,
                 embedding_function=self.sentence_transformer_ef
             )
+            with self._lock:
+                self._collections[collection_name] = collection
             logger.info(f"Collection '{collection_name}' created successfully.")
         except Exception as e:
             logger.error(f"Failed to create collection '{collection_name}': {e}")
@@ -228,8 +875,11 @@ class CollectionUtils:
         """
         logger.info(f"Attempting to delete Collection '{collection_name}'. This is not reversible")
         
+        self.invalidate_collection(collection_name)
         try:
             self.client.delete_collection(name=collection_name)
+            if (index := self.get_sparse_index(collection_name)) is not None:
+                index.clear()
             logger.info(f"Collection '{collection_name}' deleted successfully.")
         except Exception as e:
             logger.error(f"Failed to delete collection '{collection_name}': {e}")
@@ -264,71 +914,333 @@ class CollectionUtils:
         """
         logger.info(f"Attempting to reset db. This is not reversible")
         
+        self.invalidate_collection()
         try:
             self.client.reset()
+            if self.sparse_index_dir and os.path.isdir(self.sparse_index_dir):
+                for name in os.listdir(self.sparse_index_dir):
+                    if name.endswith(".json.gz"):
+                        self.get_sparse_index(name[:-len(".json.gz")]).clear()
             logger.info(f"DB reset successfully.")
         except Exception as e:
             logger.error(f"Failed to delete reset db: {e}")
     
     def get_collection(self, collection_name:str) -> Optional[Collection]:
         """
-        Get a specified collection
+        Get a specified collection. The handle is cached and reused by later calls.
 
         Args:
             collection_name (str): Name of collection to get
-            client (chromadb.PersistentClient): Chroma native client object to perform operations to chroma db
 
         Returns:
             collection (Optional[Collection]): The collection object if it exists, otherwise None.
         """
+        with self._lock:
+            collection = self._collections.get(collection_name)
+        if collection is not None:
+            self._defer_collection_saves(collection_name, collection)
+            return collection
+
         try:
-            collection = self.client.get_collection(name=collection_name)
+            collection = self.client.get_collection(
+                name=collection_name,
+                embedding_function=self.sentence_transformer_ef
+            )
+            with self._lock:
+                self._collections[collection_name] = collection
+            self._defer_collection_saves(collection_name, collection)
             logger.info(f"Get collection '{collection_name}' successfully.")
             return collection
         except Exception as e:
             logger.warning(f"Unable to get collection '{collection_name}': {e}.")
             return None
       
+    def get_or_create_collection(self, collection_name: str) -> Collection:
+        """
+        Get a collection, creating it first if it does not exist yet.
+
+        Args:
+            collection_name (str): Name of collection to get
+
+        Returns:
+            collection (Collection): The collection object.
+        """
+        collection = self.get_collection(collection_name)
+        if collection is None:
+            self.create_collection(collection_name)
+            collection = self.get_collection(collection_name)
+        if collection is None:
+            raise CollectionNotFoundException(collection_name)
+        return collection
+
     def generate_chunk_ids(self, chunks:List[Document]) -> List[Document]:
         """
         Helper function to generate chunk id and place it in chunk's metadata
 
+        Chunk ids are content addressed as `{source_key}_{text_md5}`, so a chunk keeps its id
+        when other parts of its document are edited, as long as its boundaries stay put. Documents
+        are split per section (see `ChunkingUtils.split_documents`), so an edit changes the ids of
+        chunks of its own section from the edit onwards, and those of no other section. Repeated
+        texts within the same source get a `_{n}` suffix. The position of each chunk in its
+        document is stored as `chunk_index`.
+
         Args:
             chunks (List[Document]): pdfs chunks from splitter
 
         Returns:
             chunks (List[Document]): chunks with their chunk id in their metadata
         """
-        hash_count_dic = {}
+        id_count_dic = {}
+        index_dic = {}
         for chunk in chunks:
             doc_hash = chunk.metadata.get("doc_hash")
             if not doc_hash:
                 raise ValueError("Each chunk must contain 'doc_hash' in metadata before generating IDs.")
-            
-            hash_count_dic[doc_hash] = hash_count_dic.get(doc_hash, 0) + 1
-            chunk_id = f"{doc_hash}_chunk_{hash_count_dic[doc_hash]}"
+
+            source = chunk.metadata.get("source", doc_hash)
+            source_key = hashlib.md5(source.encode("utf-8")).hexdigest()[:16]
+            text_hash = hashlib.md5(chunk.page_content.encode("utf-8")).hexdigest()
+
+            base_id = f"{source_key}_{text_hash}"
+            id_count_dic[base_id] = id_count_dic.get(base_id, 0) + 1
+            chunk_id = base_id if id_count_dic[base_id] == 1 else f"{base_id}_{id_count_dic[base_id]}"
+
             chunk.metadata["chunk_id"] = chunk_id
+            chunk.metadata["chunk_index"] = index_dic.get(doc_hash, 0)
+            index_dic[doc_hash] = chunk.metadata["chunk_index"] + 1
 
         return chunks
-    
+
+    def document_hashes_by_source(self, sources: List[str]) -> Dict[str, List[str]]:
+        """
+        Get hashes of documents already ingested from the given sources.
+
+        Args:
+            sources (List[str]): Source paths to look up.
+
+        Returns:
+            Dict[str, List[str]]: Stored document hashes for each source that has any.
+        """
+        hashes_by_source = {}
+        unique_sources = list(dict.fromkeys(sources))
+        with get_session_direct() as session:
+            for start in range(0, len(unique_sources), SQL_IN_BATCH_SIZE):
+                batch = unique_sources[start:start + SQL_IN_BATCH_SIZE]
+                statement = select(DocumentDB.source, DocumentDB.hash).where(DocumentDB.source.in_(batch))
+                for source, hash_val in session.exec(statement).all():
+                    hashes_by_source.setdefault(source, []).append(hash_val)
+        return hashes_by_source
+
+    def register_chunks(self, session: Session, chunks: List[Document]) -> None:
+        """
+        Write chunk registry rows for chunks stored in the vector store. Caller commits.
+
+        Args:
+            session (Session): Open database session.
+            chunks (List[Document]): chunks with chunk_id, doc_hash and chunk_index in metadata
+
+        Returns:
+            None
+        """
+        if not chunks:
+            return
+
+        # reuse counts stored by ChunkingUtils.split_documents, only count the rest
+        uncounted = [chunk.page_content for chunk in chunks if "token_count" not in chunk.metadata]
+        counted = iter(count_tokens(uncounted, self.embed_model_path))
+        token_counts = [chunk.metadata["token_count"] if "token_count" in chunk.metadata else next(counted) for chunk in chunks]
+        records = []
+        for chunk, token_count in zip(chunks, token_counts):
+            start_index = chunk.metadata.get("start_index", -1)
+            records.append({
+                "chunk_id": chunk.metadata["chunk_id"],
+                "doc_hash": chunk.metadata["doc_hash"],
+                "ordinal": chunk.metadata.get("chunk_index", 0),
+                "start_index": start_index,
+                "end_index": start_index + len(chunk.page_content) if start_index >= 0 else -1,
+                "token_count": token_count,
+            })
+        session.execute(insert(ChunkDB).prefix_with("OR REPLACE"), records)
+
+    def chunk_ids_by_hash(self, session: Session, hashes: List[str]) -> Dict[str, List[str]]:
+        """
+        Look up registered chunk ids of documents through the indexed doc_hash column.
+
+        Args:
+            session (Session): Open database session.
+            hashes (List[str]): Document hashes to look up.
+
+        Returns:
+            Dict[str, List[str]]: Chunk ids of each hash that has registered chunks.
+        """
+        ids_by_hash = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique_hashes), SQL_IN_BATCH_SIZE):
+            batch = unique_hashes[start:start + SQL_IN_BATCH_SIZE]
+            statement = select(ChunkDB.doc_hash, ChunkDB.chunk_id).where(ChunkDB.doc_hash.in_(batch))
+            for doc_hash, chunk_id in session.exec(statement).all():
+                ids_by_hash.setdefault(doc_hash, []).append(chunk_id)
+        return ids_by_hash
+
+    def get_chunk_provenance(self, chunk_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Find which document each chunk came from.
+
+        Args:
+            chunk_ids (List[str]): Ids of chunks, e.g. from a query result.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: doc_hash, source, ordinal and character offsets per chunk id.
+        """
+        provenance = {}
+        with get_session_direct() as session:
+            for start in range(0, len(chunk_ids), SQL_IN_BATCH_SIZE):
+                batch = chunk_ids[start:start + SQL_IN_BATCH_SIZE]
+                statement = (
+                    select(ChunkDB, DocumentDB.source)
+                    .join(DocumentDB, DocumentDB.hash == ChunkDB.doc_hash, isouter=True)
+                    .where(ChunkDB.chunk_id.in_(batch))
+                )
+                for chunk, source in session.exec(statement).all():
+                    provenance[chunk.chunk_id] = {
+                        "doc_hash": chunk.doc_hash,
+                        "source": source,
+                        "ordinal": chunk.ordinal,
+                        "start_index": chunk.start_index,
+                        "end_index": chunk.end_index,
+                        "token_count": chunk.token_count,
+                    }
+        return provenance
+
+    def collection_reindex_document(
+        self,
+        collection: Collection,
+        chunks: List[Document],
+        doc_hash: str,
+        source: str,
+        old_hashes: List[str],
+        old_collections: Optional[List[Collection]] = None,
+        base_collection: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Re-index an edited document by diffing its chunk ids against the previous version.
+
+        Only chunks whose text is new are embedded and added. Chunks that are unchanged only
+        get their metadata (doc_hash, chunk_index) updated, and chunks that disappeared are deleted.
+        New chunks are added first, the previous version is only touched once they are stored.
+
+        The previous version may be stored in other collections than `collection`, e.g. the base
+        collection or another category's partition. Its chunks are looked up in every collection
+        of `old_collections`, unchanged chunks found elsewhere are moved into `collection` and the
+        rest are deleted where they are.
+
+        Args:
+            collection (Collection): chroma object that stores the new version's chunks
+            chunks (List[Document]): chunks of the new version with chunk_id in metadata
+            doc_hash (str): Hash of the new version of the document.
+            source (str): Source path of the document.
+            old_hashes (List[str]): Hashes of previous versions stored for this source.
+            old_collections (Optional[List[Collection]]): Collections the previous version may be
+                stored in. Only `collection` if None.
+            base_collection (Optional[str]): Base collection recorded with the document hash.
+                Name of `collection` if None.
+
+        Returns:
+            Dict[str, int]: Number of chunks added, updated and deleted.
+
+        Raises:
+            IngestionBatchException: If the new chunks could not be added. The previous version is kept.
+        """
+        collection_name = getattr(collection, 'name', 'unknown')
+        if collection is None:
+            raise CollectionNotFoundException(collection_name)
+
+        with get_session_direct() as session:
+            ids_by_hash = self.chunk_ids_by_hash(session, old_hashes)
+        registered_ids = list({chunk_id for ids in ids_by_hash.values() for chunk_id in ids})
+        # documents ingested before the chunk registry existed
+        unregistered = [h for h in old_hashes if h not in ids_by_hash]
+
+        searched = {c.name: c for c in [collection] + (old_collections or []) if c is not None}
+        old_ids_by_collection: Dict[str, set] = {}
+        for name, target in searched.items():
+            found = set()
+            for start in range(0, len(registered_ids), SQL_IN_BATCH_SIZE):
+                found.update(target.get(ids=registered_ids[start:start + SQL_IN_BATCH_SIZE], include=[])["ids"])
+            if unregistered:
+                found.update(target.get(where={"doc_hash": {"$in": unregistered}}, include=[])["ids"])
+            if found:
+                old_ids_by_collection[name] = found
+
+        new_ids = {chunk.metadata["chunk_id"] for chunk in chunks}
+        kept_ids = old_ids_by_collection.get(collection_name, set())
+        to_add = [chunk for chunk in chunks if chunk.metadata["chunk_id"] not in kept_ids]
+        to_update = [chunk for chunk in chunks if chunk.metadata["chunk_id"] in kept_ids]
+        # everything of the previous version outside `collection` was either moved or removed
+        to_delete = {
+            name: list(ids - new_ids) if name == collection_name else list(ids)
+            for name, ids in old_ids_by_collection.items()
+        }
+
+        # the previous version stays searchable until the new chunks are stored
+        if not self.collection_add_documents(collection, to_add, [doc_hash], [source], base_collection=base_collection):
+            raise IngestionBatchException(collection_name, 1)
+
+        if to_update:
+            self.update_chunks_metadata(
+                collection,
+                ids=[chunk.metadata["chunk_id"] for chunk in to_update],
+                specfic_metadata=[chunk.metadata for chunk in to_update]
+            )
+        for name, ids in to_delete.items():
+            if not ids:
+                continue
+            searched[name].delete(ids=ids)
+            if (index := self.get_sparse_index(name)) is not None:
+                index.remove(ids)
+
+        with get_session_direct() as session:
+            session.execute(delete(DocumentDB).where(DocumentDB.hash.in_(old_hashes)))
+            session.execute(delete(ChunkDB).where(ChunkDB.doc_hash.in_(old_hashes)))
+            self.register_chunks(session, to_update)
+            session.commit()
+        # answers built from the previous version are stale
+        answer_cache.invalidate_documents(old_hashes)
+
+        counts = {
+            "added": len(to_add),
+            "updated": len(to_update),
+            "deleted": sum(len(ids) for ids in to_delete.values()),
+        }
+        logger.info(f"Re-indexed {source} in '{collection_name}': {counts}")
+        return counts
+
     def collection_add_documents(
         self,
         collection: Collection,
         chunks:List[Document],
         new_hashes:List[str],
-        new_sources:List[str]
-    ) -> None:
+        new_sources:List[str],
+        embeddings: Optional[List[List[float]]] = None,
+        base_collection: Optional[str] = None
+    ) -> bool:
         """
         Add chunks from pdfs to specified collection
 
+        Chunks are upserted, so adding a batch again after a crash is safe. Document hashes
+        are only recorded in SQLite once the chunks are in Chroma.
+
         Args:
             collection (Collection): chroma object that stores chunks
             chunks (List[Document]): pdfs chunks with chunk_id in metadata
             new_hashes (List[str]): Hashes corresponding to these documents.
             new_sources (List[str]): Source corresponding to these documents.
+            embeddings (Optional[List[List[float]]]): Precomputed embeddings of chunks. Computed if None.
+            base_collection (Optional[str]): Base collection recorded with the document hashes, so
+                reconciling a collection only looks at its own documents. Name of `collection` if None.
 
         Returns:
-            None
+            bool: True if the chunks and document hashes were stored.
         """
         collection_name = getattr(collection, 'name', 'unknown')
 
@@ -338,63 +1250,157 @@ class CollectionUtils:
         try:
             missing_ids = [chunk for chunk in chunks if "chunk_id" not in chunk.metadata]
             if missing_ids:
-                raise ChunkIDInvalidException(", ".join(missing_ids))
+                raise ChunkIDInvalidException(", ".join(chunk.metadata.get("source", "unknown") for chunk in missing_ids))
             
-            collection.add(
-                documents=[chunk.page_content for chunk in chunks],
-                metadatas=[chunk.metadata for chunk in chunks],
-                ids=[chunk.metadata["chunk_id"] for chunk in chunks]
-            )
-            logger.info(f"Add pdfs chunks to collection '{collection_name}' successfully.")
+            if chunks:
+                documents = [chunk.page_content for chunk in chunks]
+                collection.upsert(
+                    documents=documents,
+                    embeddings=embeddings if embeddings is not None else self.embed_texts(documents),
+                    metadatas=[chunk.metadata for chunk in chunks],
+                    ids=[chunk.metadata["chunk_id"] for chunk in chunks]
+                )
+                logger.info(f"Add pdfs chunks to collection '{collection_name}' successfully.")
+
+                if (index := self.get_sparse_index(collection_name)) is not None:
+                    index.add(
+                        [chunk.metadata["chunk_id"] for chunk in chunks],
+                        documents,
+                        [chunk.metadata.get("category") for chunk in chunks]
+                    )
         except Exception as e:
             logger.warning(f"Unable to add chunks to collection '{collection_name}': {e}.")
+            return False
         
+        created_at = sg_datetime.get_sgt_time()
+        records = [
+            {"hash": hash_val, "source": source, "collection": base_collection or collection_name, "created_at": created_at}
+            for hash_val, source in zip(new_hashes, new_sources)
+        ]
         with get_session_direct() as session:
-            for hash_val, source in zip(new_hashes, new_sources):
-                record = DocumentDB(hash=hash_val, source=source)
-                session.add(record)
+            if records:
+                session.execute(insert(DocumentDB).prefix_with("OR IGNORE"), records)
+            self.register_chunks(session, chunks)
             session.commit()
+        if chunks:
+            # answers cached before these chunks existed may miss them
+            answer_cache.invalidate_domains({chunk.metadata.get("category") for chunk in chunks})
+        return True
+
+    def add_documents_by_partition(
+        self,
+        collection_name: str,
+        chunks: List[Document],
+        new_hashes: List[str],
+        new_sources: List[str],
+        embeddings: Optional[List[List[float]]] = None
+    ) -> bool:
+        """
+        Add chunks to the partitions of a collection, routed by the category in their metadata.
+
+        Partitions are created when missing. Document hashes are recorded with the last
+        partition, so they are only stored once the chunks of every partition were added.
+
+        Args:
+            collection_name (str): Base collection name.
+            chunks (List[Document]): chunks with chunk_id and category in metadata
+            new_hashes (List[str]): Hashes of documents whose last chunks are in this batch.
+            new_sources (List[str]): Source corresponding to these documents.
+            embeddings (Optional[List[List[float]]]): Precomputed embeddings of chunks. Computed if None.
+
+        Returns:
+            bool: True if the chunks and document hashes were stored.
+        """
+        rows_by_partition: Dict[str, List[int]] = {}
+        for i, chunk in enumerate(chunks):
+            name = self.partition_name(collection_name, chunk.metadata.get("category"))
+            rows_by_partition.setdefault(name, []).append(i)
+        if not rows_by_partition:
+            rows_by_partition[collection_name] = []
+
+        names = list(rows_by_partition)
+        for position, name in enumerate(names):
+            rows = rows_by_partition[name]
+            is_last = position == len(names) - 1
+            added = self.collection_add_documents(
+                collection=self.get_or_create_collection(name),
+                chunks=[chunks[i] for i in rows],
+                new_hashes=new_hashes if is_last else [],
+                new_sources=new_sources if is_last else [],
+                embeddings=[embeddings[i] for i in rows] if embeddings is not None else None,
+                base_collection=collection_name
+            )
+            if not added:
+                return False
+        return True
     
     def collection_delete_documents(
         self, 
-        collection: Collection,
+        collection: Union[Collection, List[Collection]],
         hashes:List[str]
     ) -> None:
         """
         Delete all chunks from a pdf in selected collection
 
         Args:
-            collection (Collection): chroma object that stores chunks
+            collection (Union[Collection, List[Collection]]): chroma object that stores chunks, or every
+                partition the chunks may be stored in
             hashes (List[str]): Hashes corresponding to these documents.
 
         Returns:
             None
         """
-        collection_name = getattr(collection, 'name', 'unknown')
-        if collection is None:
+        collections = collection if isinstance(collection, list) else [collection]
+        collection_name = ", ".join(getattr(c, 'name', 'unknown') for c in collections)
+        if not collections or any(c is None for c in collections):
             raise CollectionNotFoundException(collection_name)
         
         if not hashes:
             logger.info(f"No document hashes provided for deletion in '{collection_name}'.")
             return
 
-        deleted_hash = []
-        for h in hashes:
+        unique_hashes = list(dict.fromkeys(hashes))
+        batches = [
+            unique_hashes[start:start + SQL_IN_BATCH_SIZE]
+            for start in range(0, len(unique_hashes), SQL_IN_BATCH_SIZE)
+        ]
+
+        # Stage SQLite deletes, only commit them once Chroma delete succeeded
+        with get_session_direct() as session:
+            sources = []
+            for batch in batches:
+                sources.extend(session.exec(select(DocumentDB.source).where(DocumentDB.hash.in_(batch))).all())
+                session.execute(delete(DocumentDB).where(DocumentDB.hash.in_(batch)))
+            # forget fingerprints so the files are ingested again if still present
+            for start in range(0, len(sources), SQL_IN_BATCH_SIZE):
+                session.execute(
+                    delete(FileFingerprintDB).where(FileFingerprintDB.path.in_(sources[start:start + SQL_IN_BATCH_SIZE]))
+                )
+
+            ids_by_hash = self.chunk_ids_by_hash(session, unique_hashes)
+            chunk_ids = [chunk_id for ids in ids_by_hash.values() for chunk_id in ids]
+            # documents ingested before the chunk registry existed
+            unregistered = [h for h in unique_hashes if h not in ids_by_hash]
+            for batch in batches:
+                session.execute(delete(ChunkDB).where(ChunkDB.doc_hash.in_(batch)))
+
             try:
-                collection.delete(where={"doc_hash": h})
-                deleted_hash.append(h)
-                logger.debug(f"Successfully deleted document(s) with doc_hash '{h}' from '{collection_name}'.")
+                for target in collections:
+                    for start in range(0, len(chunk_ids), SQL_IN_BATCH_SIZE):
+                        target.delete(ids=chunk_ids[start:start + SQL_IN_BATCH_SIZE])
+                    for start in range(0, len(unregistered), SQL_IN_BATCH_SIZE):
+                        target.delete(where={"doc_hash": {"$in": unregistered[start:start + SQL_IN_BATCH_SIZE]}})
             except Exception as e:
-                logger.warning(f"Fail to deleted document(s) with doc_hash '{h}' from '{collection_name}'.")
-        
-        with get_session_direct() as session:
-            for h in deleted_hash:
-                statement = select(DocumentDB).where(DocumentDB.hash == h)
-                record = session.exec(statement).first()
-                if record:
-                    session.delete(record)
+                session.rollback()
+                logger.warning(f"Fail to delete document(s) from '{collection_name}', SQLite changes rolled back: {e}.")
+                return
+
             session.commit()
-            logger.info(f"Successfully removed {len(hashes)} document hash(es) from SQLite DB.")
+            for target in collections:
+                if (index := self.get_sparse_index(target.name)) is not None:
+                    index.remove(chunk_ids)
+            answer_cache.invalidate_documents(unique_hashes)
+            logger.info(f"Successfully removed {len(unique_hashes)} document hash(es) from '{collection_name}' and SQLite DB.")
 
     def metadata_filter_chunks(
         self,
@@ -428,7 +1434,7 @@ class CollectionUtils:
             logger.warning(f"Unable to filter chunks from collection '{collection_name}': {e}.")
             return None
 
-    def delete_chunks(self, collection: Collection, chunks_id: Dict) -> None:
+    def delete_chunks(self, collection: Collection, chunks_id: List[str]) -> None:
         """
         Delete chunks from query from a collection
 
@@ -445,7 +1451,15 @@ class CollectionUtils:
             raise CollectionNotFoundException(collection_name)
         
         try:
-            collection.delete(ids=ids_list)
+            metadatas = collection.get(ids=chunks_id, include=["metadatas"])["metadatas"]
+            doc_hashes = list({(metadata or {}).get("doc_hash") for metadata in metadatas} - {None})
+            collection.delete(ids=chunks_id)
+            if (index := self.get_sparse_index(collection_name)) is not None:
+                index.remove(chunks_id)
+            with get_session_direct() as session:
+                session.execute(delete(ChunkDB).where(ChunkDB.chunk_id.in_(chunks_id)))
+                session.commit()
+            answer_cache.invalidate_documents(doc_hashes)
             logger.info(f"Successfully deleted chunks from collection '{collection_name}'.")
         except Exception as e:
             logger.warning(f"Unable to delete chunks from collection '{collection_name}': {e}.")
@@ -521,7 +1535,7 @@ class CollectionUtils:
         
         try:
             query_result = collection.query(
-                query_texts=[query_text],
+                query_embeddings=self.embed_texts([query_text]),
                 n_results=n_results,
                 where=filter_keys
             )
@@ -531,11 +1545,200 @@ class CollectionUtils:
             logger.warning(f"Unable to query collection '{collection_name}': {e}.")
             return None
 
+    def query_collection_by_name(
+        self,
+        collection_name: str,
+        query_text: str,
+        filter_keys: Optional[Dict] = None,
+        n_results: Optional[int] = 10
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Query a collection through its shared handle, reconnecting once if the handle is stale.
+
+        A stale handle happens when the collection was deleted and rebuilt after it was cached.
+
+        Args:
+            collection_name (str): Name of collection to query
+            query_text (str): query from user
+            filter_keys (Dict): metadata keys in for filtering
+            n_results (int): number of chunks to return
+
+        Returns:
+            query_result (Optional[Dict[str, Any]]): Chunks similar to query text, None if query fails.
+        """
+        for attempt in range(2):
+            collection = self.get_collection(collection_name)
+            if collection is None:
+                raise CollectionNotFoundException(collection_name)
+
+            try:
+                query_result = collection.query(
+                    query_embeddings=self.embed_texts([query_text]),
+                    n_results=n_results,
+                    where=filter_keys
+                )
+                logger.info(f"Query from collection '{collection_name}' successfully.")
+                return query_result
+            except Exception as e:
+                logger.warning(f"Unable to query collection '{collection_name}' (attempt {attempt + 1}): {e}.")
+                self.invalidate_collection(collection_name)
+
+        return None
+
+    def hybrid_query_by_name(
+        self,
+        collection_name: str,
+        query_text: str,
+        filter_keys: Optional[Dict] = None,
+        n_results: Optional[int] = 10,
+        n_candidates: int = HYBRID_CANDIDATES,
+        rrf_k: int = RRF_K
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Query with BM25 and vector search, fusing both rankings with reciprocal-rank fusion.
+
+        Exact terms such as acronyms or clause numbers are matched by BM25 even when the dense
+        embedding misses them. The BM25 side only supports a `category` filter. Falls back to
+        vector results if no sparse index exists.
+
+        Args:
+            collection_name (str): Name of collection to query
+            query_text (str): query from user
+            filter_keys (Dict): metadata keys in for filtering
+            n_results (int): number of chunks to return
+            n_candidates (int): number of chunks taken from each retriever before fusion
+            rrf_k (int): reciprocal-rank fusion constant
+
+        Returns:
+            query_result (Optional[Dict[str, Any]]): ids, documents and metadatas of fused results,
+                in the same nested layout as a Chroma query result. None if the query fails.
+        """
+        dense_result = self.query_collection_by_name(
+            collection_name, query_text, filter_keys=filter_keys, n_results=max(n_results, n_candidates)
+        )
+        if dense_result is None:
+            return None
+
+        index = self.get_sparse_index(collection_name)
+        if index is None or len(index) == 0:
+            return {key: [dense_result[key][0][:n_results]] for key in ("ids", "documents", "metadatas")}
+
+        category = (filter_keys or {}).get("category")
+        sparse_ids = [chunk_id for chunk_id, _ in index.search(query_text, n_candidates, category=category)]
+        dense_ids = dense_result["ids"][0]
+        fused_ids = [chunk_id for chunk_id, _ in reciprocal_rank_fusion([dense_ids, sparse_ids], k=rrf_k)][:n_results]
+
+        chunks = {
+            chunk_id: (document, metadata)
+            for chunk_id, document, metadata in zip(dense_ids, dense_result["documents"][0], dense_result["metadatas"][0])
+        }
+        sparse_only = [chunk_id for chunk_id in fused_ids if chunk_id not in chunks]
+        if sparse_only:
+            fetched = self.get_collection(collection_name).get(ids=sparse_only, include=["documents", "metadatas"])
+            chunks.update({
+                chunk_id: (document, metadata)
+                for chunk_id, document, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+            })
+
+        fused_ids = [chunk_id for chunk_id in fused_ids if chunk_id in chunks]
+        logger.info(f"Hybrid query fused {len(dense_ids)} dense and {len(sparse_ids)} sparse candidate(s).")
+        return {
+            "ids": [fused_ids],
+            "documents": [[chunks[chunk_id][0] for chunk_id in fused_ids]],
+            "metadatas": [[chunks[chunk_id][1] for chunk_id in fused_ids]],
+        }
+
+    def query_partitions(
+        self,
+        collection_name: str,
+        query_text: str,
+        category: Optional[str] = None,
+        n_results: Optional[int] = 10,
+        hybrid: bool = False,
+        rrf_k: int = RRF_K
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Query the partition of a category, or every partition when the category is unknown.
+
+        Without partitioning this queries `collection_name` with a category filter. A routed
+        query searches only its partition, no filter needed, and falls back to the base collection
+        with a category filter while the partition does not exist yet, e.g. on a store built
+        before partitioning that was not repartitioned. Fan-out results are merged by
+        distance, or by reciprocal-rank fusion of the partition rankings for hybrid queries,
+        whose fused results carry no distance.
 
-chunking_helper = ChunkingUtils(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        Args:
+            collection_name (str): Base collection name.
+            query_text (str): query from user
+            category (Optional[str]): Category to search. All partitions are searched if unknown.
+            n_results (int): number of chunks to return
+            hybrid (bool): Use `hybrid_query_by_name` instead of vector search only.
+            rrf_k (int): reciprocal-rank fusion constant for merging hybrid partitions
+
+        Returns:
+            query_result (Optional[Dict[str, Any]]): ids, documents and metadatas of results, in the
+                same nested layout as a Chroma query result. None if the query fails.
+        """
+        query_fn = self.hybrid_query_by_name if hybrid else self.query_collection_by_name
+        known = self.match_category(category)
+
+        if not self.partition_by_category:
+            filter_keys = {"category": known} if known else None
+            return query_fn(collection_name, query_text, filter_keys=filter_keys, n_results=n_results)
+        if known:
+            partition = self.partition_name(collection_name, known)
+            if self.get_collection(partition) is not None:
+                return query_fn(partition, query_text, n_results=n_results)
+            logger.info(f"Partition '{partition}' not found, querying '{collection_name}' by category.")
+            return query_fn(collection_name, query_text, filter_keys={"category": known}, n_results=n_results)
+
+        results, found = [], False
+        for name in self.partition_names(collection_name):
+            try:
+                result = query_fn(name, query_text, n_results=n_results)
+            except CollectionNotFoundException:
+                continue
+            found = True
+            if result is not None:
+                results.append(result)
+        if not found:
+            raise CollectionNotFoundException(collection_name)
+        if not results:
+            return None
+
+        chunks = {}
+        for result in results:
+            distances = (result.get("distances") or [None])[0] or [None] * len(result["ids"][0])
+            for chunk_id, document, metadata, distance in zip(
+                result["ids"][0], result["documents"][0], result["metadatas"][0], distances
+            ):
+                chunks[chunk_id] = (document, metadata, distance)
+
+        if all(distance is not None for _, _, distance in chunks.values()):
+            merged_ids = sorted(chunks, key=lambda chunk_id: chunks[chunk_id][2])[:n_results]
+        else:
+            rankings = [result["ids"][0] for result in results]
+            merged_ids = [chunk_id for chunk_id, _ in reciprocal_rank_fusion(rankings, k=rrf_k)][:n_results]
+
+        logger.info(f"Fan-out query merged {len(chunks)} candidate(s) from {len(results)} partition(s).")
+        return {
+            "ids": [merged_ids],
+            "documents": [[chunks[chunk_id][0] for chunk_id in merged_ids]],
+            "metadatas": [[chunks[chunk_id][1] for chunk_id in merged_ids]],
+        }
+
+
+chunking_helper = ChunkingUtils(
+    chunk_size=CHUNK_TOKEN_SIZE if CHUNK_MODE == "tokens" else CHUNK_SIZE,
+    chunk_overlap=CHUNK_TOKEN_OVERLAP if CHUNK_MODE == "tokens" else CHUNK_OVERLAP,
+    chunk_mode=CHUNK_MODE,
+)
 collection_helper = CollectionUtils(
     chroma_db_dir=CHROMA_DB_DIR,
     embed_model_path=EMBED_MODEL_PATH,
+    embed_cache_path=EMBED_CACHE_PATH,
+    sparse_index_dir=BM25_INDEX_DIR,
+    flat_index_dir=FLAT_INDEX_DIR,
 )
 
 # make them available when importing the module
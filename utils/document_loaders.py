@@ -0,0 +1,97 @@
+import os
+import re
+from typing import Iterator, List, Optional, Tuple
+from langchain.schema import Document
+from langchain_community.document_loaders import PyPDFLoader
+
+# parsing runs in worker processes, which import this module on spawn, so it must not import
+# utils.chroma_db or anything else that loads models or opens stores at import time
+
+# numbered headings such as "4. Leave Policies" or "4.1 Annual Leave"
+HEADING_PATTERN = re.compile(r"^\d+(\.\d+)*\.?\s+[A-Z][^.!?:;]{0,80}$")
+
+def load_pdf(file_path: str) -> Tuple[str, List[Document], Optional[str]]:
+    """
+    Load a single pdf. Module level so it can be pickled into worker processes.
+
+    Args:
+        file_path (str): Path to the pdf.
+
+    Returns:
+        Tuple of file path, loaded documents and error message (None on success).
+    """
+    try:
+        loader = PyPDFLoader(file_path, mode="single")
+        return file_path, loader.load(), None
+    except Exception as e:
+        return file_path, [], str(e)
+
+def _docx_blocks(document) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Walk a docx body in order, yielding (text, heading) per paragraph or table row.
+    heading is the paragraph text when it uses a Title/Heading style or reads as a
+    numbered heading, otherwise None.
+    """
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            paragraph = Paragraph(child, document)
+            text = paragraph.text.strip()
+            if not text:
+                continue
+            style_name = paragraph.style.name if paragraph.style is not None else ""
+            is_heading = style_name.startswith("Heading") or style_name == "Title" or bool(HEADING_PATTERN.match(text))
+            yield text, text if is_heading else None
+        elif tag == "tbl":
+            for row in Table(child, document).rows:
+                cells = list(dict.fromkeys(cell.text.strip() for cell in row.cells if cell.text.strip()))
+                if cells:
+                    yield " | ".join(cells), None
+
+def load_docx(file_path: str) -> Tuple[str, List[Document], Optional[str]]:
+    """
+    Load a single docx into one Document, reading paragraphs and tables directly.
+
+    Heading positions are kept in metadata as `section_offsets` ([char offset, heading] pairs),
+    which `ChunkingUtils.split_documents` turns into a `section` on each chunk.
+
+    Args:
+        file_path (str): Path to the docx.
+
+    Returns:
+        Tuple of file path, loaded documents and error message (None on success).
+    """
+    try:
+        import docx
+        document = docx.Document(file_path)
+
+        parts, section_offsets = [], []
+        offset = 0
+        for text, heading in _docx_blocks(document):
+            if heading:
+                section_offsets.append([offset, heading])
+            parts.append(text)
+            offset += len(text) + 1
+
+        metadata = {"source": file_path, "section_offsets": section_offsets}
+        return file_path, [Document(page_content="\n".join(parts), metadata=metadata)], None
+    except Exception as e:
+        return file_path, [], str(e)
+
+# loaders for each supported file extension
+FILE_LOADERS = {
+    ".pdf": load_pdf,
+    ".docx": load_docx,
+}
+
+def load_file(file_path: str) -> Tuple[str, List[Document], Optional[str]]:
+    """ Load a file with the loader registered for its extension. """
+    loader = FILE_LOADERS.get(os.path.splitext(file_path)[1].lower())
+    if loader is None:
+        return file_path, [], "Unsupported file type"
+    return loader(file_path)
+
+__all__ = ["load_file", "load_pdf", "load_docx", "FILE_LOADERS", "HEADING_PATTERN"]
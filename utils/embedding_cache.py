@@ -0,0 +1,134 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+class EmbeddingCache:
+    """
+    Persistent content-addressed cache of text embeddings.
+
+    Each entry is keyed by sha256(model_id, text) and stored as a raw float32 array
+    in a small SQLite file. Entries carry a last-used timestamp and the least recently
+    used ones are evicted once the cache grows past `max_entries`.
+
+    Args:
+        cache_path (str): Path to the SQLite file backing the cache.
+        model_id (str): Identifier of the embedding model, part of every key.
+        max_entries (int): Maximum number of embeddings kept on disk.
+    """
+
+    def __init__(self, cache_path: str, model_id: str, max_entries: int):
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+
+    def make_key(self, text: str) -> str:
+        """ Content address of a text for the current model. """
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up cached embeddings for a list of texts.
+
+        Args:
+            texts (Sequence[str]): Texts to look up.
+
+        Returns:
+            List[Optional[np.ndarray]]: float32 vector per text, None where the text is not cached.
+        """
+        keys = [self.make_key(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+
+        with self._lock:
+            # chunk IN lists to stay below SQLite's bound variable limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """
+        Store embeddings for a list of texts and evict old entries if the cache is full.
+
+        Args:
+            texts (Sequence[str]): Texts that were embedded.
+            vectors (Sequence[Sequence[float]]): Embedding of each text.
+
+        Returns:
+            None
+        """
+        if len(texts) != len(vectors):
+            raise ValueError("Mismatch of number of texts and vectors.")
+
+        now = time.time()
+        rows = [
+            (self.make_key(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """ Remove least recently used entries above `max_entries`. Caller holds the lock. """
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Evicted {excess} embedding(s) from cache.")
+
+    def clear(self) -> None:
+        """ Remove every cached embedding. """
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """ Hit/miss counters of this process. """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,466 @@
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+import numpy as np
+from logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, writers are then only serialised within a process
+    fcntl = None
+
+logger = get_logger(__name__)
+
+# superseded versions are kept this long so readers that just read the old manifest can still load it
+VERSION_GRACE_SECONDS = 60
+# rows upcast at a time when scoring a float16 matrix
+SCORE_BLOCK_ROWS = 8192
+
+def _matches(metadata: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """ Evaluate a Chroma style `where` filter ($eq, $ne, $in, $nin, $and, $or) on one metadata dict. """
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+class FlatCollection:
+    """
+    Exact-search vector collection backed by a memory-mapped `.npy` matrix.
+
+    Implements the subset of the Chroma Collection API used by CollectionUtils (add, upsert,
+    update, get, delete, query, count), so it can stand in for a Chroma collection. Embeddings
+    are L2-normalised and stored as float32 or float16. float16 only halves storage: numpy has
+    no fast float16 matmul, so those matrices are upcast and scored in blocks of SCORE_BLOCK_ROWS.
+
+    Every write saves a new version of the matrix and records and then atomically swaps a
+    manifest, so other processes memory-mapping the same files keep reading a consistent version
+    and pick up the new one on their next call. Inside `deferred_save` writes are kept in memory
+    and the version is saved once when the block exits, so streaming many batches in does not
+    rewrite the whole collection per batch. Writes hold an exclusive file lock from load to save
+    (for the whole block when deferred), so writers in different processes never build on the
+    same version. Superseded versions are deleted VERSION_GRACE_SECONDS after they were replaced.
+    Queries are a single matrix-vector product over the mapped matrix, with rows outside the
+    `where` filter masked out.
+
+    Args:
+        name (str): Collection name.
+        path (str): Directory holding the collection files.
+        dtype (str): "float32" or "float16" storage of embeddings.
+    """
+
+    def __init__(self, name: str, path: str, dtype: str = "float32"):
+        self.name = name
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._version: Optional[str] = None
+        self._vectors = np.zeros((0, 0), dtype=self.dtype)
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._lock_file = None
+        self._lock_depth = 0
+        self._save_depth = 0
+        self._dirty = False
+        self._buffer: Optional[np.ndarray] = None
+        os.makedirs(path, exist_ok=True)
+        self._refresh()
+
+    # ---------- persistence ----------
+    @property
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """ Exclusive lock on the collection directory, held by the process. Re-entrant. """
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self._lock_file = open(os.path.join(self.path, "write.lock"), "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_file is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """ Hold the thread lock and an exclusive lock on the collection directory. Re-entrant. """
+        with self._file_lock(), self._lock:
+            yield
+
+    @contextmanager
+    def deferred_save(self) -> Iterator["FlatCollection"]:
+        """
+        Keep writes in memory inside the block and save once when the outermost block exits.
+        Other processes cannot write the collection until then, queries of this process see
+        the unsaved writes.
+        """
+        with self._file_lock():
+            with self._lock:
+                self._refresh()
+                self._save_depth += 1
+            try:
+                yield self
+            finally:
+                with self._lock:
+                    self._save_depth -= 1
+                    if self._save_depth == 0 and self._dirty:
+                        self._dirty = False
+                        self._buffer = None
+                        self._save(self._vectors, self._ids, self._documents, self._metadatas)
+
+    def _refresh(self) -> None:
+        """ Load the version named in the manifest if it is not the one already loaded. """
+        if self._dirty:
+            # unsaved writes are newer than the manifest
+            return
+        for attempt in range(2):
+            try:
+                with open(self._manifest_path, "r", encoding="utf-8") as f:
+                    version = json.load(f)["version"]
+            except (OSError, ValueError, KeyError):
+                return
+            if version == self._version:
+                return
+
+            try:
+                vectors = np.load(os.path.join(self.path, f"vectors-{version}.npy"), mmap_mode="r")
+                with open(os.path.join(self.path, f"records-{version}.json"), "r", encoding="utf-8") as f:
+                    records = json.load(f)
+                break
+            except FileNotFoundError:
+                # the manifest moved on and this version was collected, read it again
+                if attempt == 1:
+                    raise
+
+        self._vectors = vectors
+        self._ids, self._documents, self._metadatas = records["ids"], records["documents"], records["metadatas"]
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._columns = {}
+        self._version = version
+
+    def _writable(self, rows: int, dim: int) -> np.ndarray:
+        """
+        Writable matrix of `rows` rows starting with the current ones, the rest uninitialised.
+        While saves are deferred it is a view of a buffer that grows geometrically and is reused
+        by later writes, so appending a batch does not copy every row. Caller holds the lock.
+        """
+        current = len(self._vectors)
+        if self._save_depth > 0 and self._buffer is not None and self._vectors.base is self._buffer and len(self._buffer) >= rows:
+            return self._buffer[:rows]
+
+        capacity = max(rows, 2 * current, 1024) if self._save_depth > 0 else rows
+        buffer = np.empty((capacity, dim), dtype=self.dtype)
+        if current:
+            buffer[:current] = self._vectors
+        if self._save_depth > 0:
+            self._buffer = buffer
+        return buffer[:rows]
+
+    def _save(
+        self,
+        vectors: np.ndarray,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+        positions: Optional[Dict[str, int]] = None
+    ) -> None:
+        """ Write a new version and point the manifest at it, or keep it in memory while saves are deferred. Caller holds the lock. """
+        if self._save_depth > 0:
+            self._vectors, self._ids, self._documents, self._metadatas = vectors, ids, documents, metadatas
+            self._positions = positions if positions is not None else {chunk_id: i for i, chunk_id in enumerate(ids)}
+            self._columns = {}
+            self._dirty = True
+            return
+
+        version = f"{time.time_ns()}"
+        np.save(os.path.join(self.path, f"vectors-{version}.npy"), np.ascontiguousarray(vectors, dtype=self.dtype))
+        with open(os.path.join(self.path, f"records-{version}.json"), "w", encoding="utf-8") as f:
+            json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f)
+
+        tmp_path = f"{self._manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version}, f)
+        os.replace(tmp_path, self._manifest_path)
+
+        self._collect_versions(version)
+        self._refresh()
+
+    def _collect_versions(self, current: str) -> None:
+        """
+        Delete versions replaced more than VERSION_GRACE_SECONDS ago, and leftovers of writers
+        that died before swapping the manifest. Caller holds the write lock.
+
+        A version was replaced when its successor was written, and version names are write times.
+        Readers that already mapped a deleted version keep their open file.
+        """
+        versions = sorted(
+            {name.split("-", 1)[1].rsplit(".", 1)[0] for name in os.listdir(self.path) if name.startswith(("vectors-", "records-"))},
+            key=int
+        )
+        now = time.time_ns()
+        expired = [
+            older for older, newer in zip(versions, versions[1:])
+            if int(older) < int(current) and now - int(newer) > VERSION_GRACE_SECONDS * 1e9
+        ]
+        expired += [version for version in versions if int(version) > int(current)]
+        for version in expired:
+            for name in (f"vectors-{version}.npy", f"records-{version}.json"):
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+
+    def _column(self, key: str) -> np.ndarray:
+        """ Metadata values of one key as an array, cached per version for vectorised masks. """
+        if key not in self._columns:
+            column = np.empty(len(self._metadatas), dtype=object)
+            column[:] = [metadata.get(key) for metadata in self._metadatas]
+            self._columns[key] = column
+        return self._columns[key]
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        """ Boolean mask of rows matching a `where` filter. Plain equality and $in are vectorised. """
+        mask = np.ones(len(self._ids), dtype=bool)
+        if not where:
+            return mask
+        for key, condition in where.items():
+            if key.startswith("$"):
+                return np.array([_matches(metadata, where) for metadata in self._metadatas], dtype=bool)
+            if isinstance(condition, dict):
+                if set(condition) == {"$in"}:
+                    column = self._column(key)
+                    mask &= np.logical_or.reduce([column == value for value in condition["$in"]] or [np.zeros(len(column), dtype=bool)])
+                elif set(condition) == {"$eq"}:
+                    mask &= self._column(key) == condition["$eq"]
+                else:
+                    mask &= np.array([_matches(metadata, {key: condition}) for metadata in self._metadatas], dtype=bool)
+            else:
+                mask &= self._column(key) == condition
+        return mask
+
+    # ---------- Chroma collection API ----------
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._ids)
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> None:
+        new_vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(new_vectors, axis=1, keepdims=True)
+        new_vectors = new_vectors / np.where(norms == 0, 1, norms)
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._write_lock():
+            self._refresh()
+            if self._save_depth > 0:
+                # the in-memory version is not shared with a saved one, extend it in place
+                all_ids, all_documents, all_metadatas = self._ids, self._documents, self._metadatas
+                positions = self._positions
+            else:
+                all_ids, all_documents, all_metadatas = list(self._ids), list(self._documents), list(self._metadatas)
+                positions = dict(self._positions)
+
+            rows = []
+            for i, chunk_id in enumerate(ids):
+                position = positions.get(chunk_id)
+                if position is None:
+                    position = positions[chunk_id] = len(all_ids)
+                    all_ids.append(chunk_id)
+                    all_documents.append(documents[i])
+                    all_metadatas.append(dict(metadatas[i]))
+                else:
+                    all_documents[position] = documents[i]
+                    all_metadatas[position] = dict(metadatas[i])
+                rows.append(position)
+
+            vectors = self._writable(len(all_ids), new_vectors.shape[1])
+            for i, row in enumerate(rows):
+                vectors[row] = new_vectors[i]
+            self._save(vectors, all_ids, all_documents, all_metadatas, positions)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None) -> None:
+        with self._write_lock():
+            self._refresh()
+            existing = [chunk_id for chunk_id in ids if chunk_id in self._positions]
+            if existing:
+                raise ValueError(f"Ids already exist in collection '{self.name}': {existing[:5]}")
+            self.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        with self._write_lock():
+            self._refresh()
+            all_metadatas = list(self._metadatas)
+            for chunk_id, metadata in zip(ids, metadatas):
+                position = self._positions.get(chunk_id)
+                if position is not None:
+                    all_metadatas[position] = {**all_metadatas[position], **metadata}
+            self._save(np.asarray(self._vectors), list(self._ids), list(self._documents), all_metadatas)
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        with self._write_lock():
+            self._refresh()
+            keep = np.ones(len(self._ids), dtype=bool)
+            if ids is not None:
+                for chunk_id in ids:
+                    position = self._positions.get(chunk_id)
+                    if position is not None:
+                        keep[position] = False
+            if where:
+                keep &= ~self._mask(where)
+            if keep.all():
+                return
+            kept = np.flatnonzero(keep)
+            self._save(
+                np.asarray(self._vectors)[kept] if len(kept) else np.zeros((0, self._vectors.shape[1]), dtype=self.dtype),
+                [self._ids[i] for i in kept],
+                [self._documents[i] for i in kept],
+                [self._metadatas[i] for i in kept],
+            )
+
+    def get(
+        self,
+        ids: Optional[Sequence[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: Sequence[str] = ("documents", "metadatas")
+    ) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                rows = [self._positions[chunk_id] for chunk_id in ids if chunk_id in self._positions]
+                if where:
+                    mask = self._mask(where)
+                    rows = [row for row in rows if mask[row]]
+            else:
+                rows = list(np.flatnonzero(self._mask(where)))
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+
+            result = {"ids": [self._ids[row] for row in rows]}
+            result["documents"] = [self._documents[row] for row in rows] if "documents" in include else None
+            result["metadatas"] = [self._metadatas[row] for row in rows] if "metadatas" in include else None
+            result["embeddings"] = np.asarray(self._vectors[rows], dtype=np.float32) if "embeddings" in include else None
+            return result
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Optional[Dict[str, Any]] = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances")
+    ) -> Dict[str, List]:
+        with self._lock:
+            self._refresh()
+            vectors, ids, documents, metadatas = self._vectors, self._ids, self._documents, self._metadatas
+            mask = self._mask(where)
+        n_candidates = int(mask.sum())
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_embedding in query_embeddings:
+            query = np.asarray(query_embedding, dtype=np.float32)
+            query = query / (np.linalg.norm(query) or 1)
+
+            if n_candidates == 0:
+                top = np.array([], dtype=int)
+                scores = np.array([], dtype=np.float32)
+            else:
+                # score the mapped matrix in place, gathering candidate rows would copy them per query
+                if vectors.dtype == np.float32:
+                    scores = np.asarray(vectors @ query)
+                else:
+                    # numpy has no fast float16 matmul, upcast one block at a time
+                    scores = np.empty(len(vectors), dtype=np.float32)
+                    for start in range(0, len(vectors), SCORE_BLOCK_ROWS):
+                        scores[start:start + SCORE_BLOCK_ROWS] = vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ query
+                scores[~mask] = -np.inf
+                k = min(n_results, n_candidates)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+
+            result["ids"].append([ids[row] for row in top])
+            result["documents"].append([documents[row] for row in top])
+            result["metadatas"].append([metadatas[row] for row in top])
+            result["distances"].append([float(1 - scores[row]) for row in top])
+        return result
+
+class FlatClient:
+    """
+    Minimal stand-in for chromadb.PersistentClient that manages FlatCollections in a directory.
+
+    Args:
+        path (str): Directory holding one sub-directory per collection.
+        dtype (str): "float32" or "float16" storage of embeddings.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32"):
+        self.path = path
+        self.dtype = dtype
+        os.makedirs(path, exist_ok=True)
+
+    def _collection_path(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def create_collection(self, name: str, embedding_function=None) -> FlatCollection:
+        if os.path.isdir(self._collection_path(name)):
+            raise ValueError(f"Collection '{name}' already exists.")
+        return FlatCollection(name, self._collection_path(name), dtype=self.dtype)
+
+    def get_collection(self, name: str, embedding_function=None) -> FlatCollection:
+        if not os.path.isdir(self._collection_path(name)):
+            raise ValueError(f"Collection '{name}' does not exist.")
+        return FlatCollection(name, self._collection_path(name), dtype=self.dtype)
+
+    def delete_collection(self, name: str) -> None:
+        if not os.path.isdir(self._collection_path(name)):
+            raise ValueError(f"Collection '{name}' does not exist.")
+        shutil.rmtree(self._collection_path(name))
+
+    def list_collections(self) -> List[FlatCollection]:
+        return [
+            FlatCollection(name, self._collection_path(name), dtype=self.dtype)
+            for name in sorted(os.listdir(self.path))
+            if os.path.isdir(self._collection_path(name))
+        ]
+
+    def reset(self) -> None:
+        for name in os.listdir(self.path):
+            shutil.rmtree(self._collection_path(name), ignore_errors=True)
@@ -1,8 +1,9 @@
 import os
 from dotenv import load_dotenv
 from huggingface_hub import login
-from transformers import AutoModel, AutoTokenizer
-from sentence_transformers import SentenceTransformer
+from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+import numpy as np
 
 load_dotenv()
 
@@ -30,6 +31,84 @@ def download_hf_model(model_name, model_dir):
     except Exception as e:
         print(f'Unable to download model: {e}')
 
+def download_cross_encoder(model_name, model_dir):
+    '''
+    Downloads a cross-encoder reranking model from Huggingface
+
+    Parameters:
+    - model_name(str): Name of model on huggingface
+    - model_dir(os.path): Directory for where model will be saved, RERANK_MODEL_PATH in config
+
+    '''
+    try:
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        # Save to a local path, sentence_transformers.CrossEncoder loads it from there
+        tokenizer.save_pretrained(model_dir)
+        model.save_pretrained(model_dir)
+    except Exception as e:
+        print(f'Unable to download model: {e}')
+
+def export_onnx_model(model_dir, quantization=None):
+    '''
+    Exports a local sentence transformer model to ONNX, saved under model_dir/onnx.
+    Requires the optional `optimum[onnxruntime]` package.
+
+    Parameters:
+    - model_dir(os.path): Directory of the local model
+    - quantization(str): int8 dynamic quantization config ("arm64", "avx2", "avx512", "avx512_vnni"). No quantization if None.
+
+    '''
+    try:
+        model = SentenceTransformer(model_dir, backend="onnx", device="cpu")
+        model.save_pretrained(model_dir)
+        print(f'Exported ONNX model to {os.path.join(model_dir, "onnx")}')
+        if quantization:
+            export_dynamic_quantized_onnx_model(model, quantization_config=quantization, model_name_or_path=model_dir)
+            print(f'Exported int8 ({quantization}) ONNX model to {os.path.join(model_dir, "onnx")}')
+    except Exception as e:
+        print(f'Unable to export ONNX model: {e}')
+
+def check_onnx_parity(model_dir, texts, file_name="onnx/model.onnx", min_cosine=0.99):
+    '''
+    Compares embeddings of the PyTorch model against an exported ONNX model.
+
+    Each text is embedded by both backends and their cosine similarity is measured. Retrieval
+    parity is measured by using each text as a query against the others and checking that
+    both backends rank the same nearest neighbour first.
+
+    Parameters:
+    - model_dir(os.path): Directory of the local model
+    - texts(List[str]): Sample chunks and queries, at least 2
+    - file_name(str): ONNX file to compare, relative to model_dir
+    - min_cosine(float): Lowest acceptable cosine similarity between backends
+
+    Returns:
+    - report(dict): min/mean cosine, top-1 neighbour agreement and whether min_cosine was met
+    '''
+    torch_model = SentenceTransformer(model_dir, device="cpu")
+    onnx_model = SentenceTransformer(model_dir, backend="onnx", device="cpu", model_kwargs={"file_name": file_name})
+
+    torch_emb = torch_model.encode(texts, normalize_embeddings=True)
+    onnx_emb = onnx_model.encode(texts, normalize_embeddings=True)
+
+    cosines = np.sum(torch_emb * onnx_emb, axis=1)
+
+    torch_sim = torch_emb @ torch_emb.T
+    onnx_sim = onnx_emb @ onnx_emb.T
+    np.fill_diagonal(torch_sim, -np.inf)
+    np.fill_diagonal(onnx_sim, -np.inf)
+    top1_agreement = float(np.mean(torch_sim.argmax(axis=1) == onnx_sim.argmax(axis=1)))
+
+    report = {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "top1_agreement": top1_agreement,
+        "passed": bool(cosines.min() >= min_cosine),
+    }
+    print(f'ONNX parity for {file_name}: {report}')
+    return report
+
 
 # To add models from huggingface
 if __name__ == "__main__":
@@ -37,3 +116,10 @@ if __name__ == "__main__":
     model_dir = "../agents/local_models/arctic-embed-m"
     download_hf_model(model_name, model_dir)
 
+    # To rerank retrieved chunks (RERANK_ENABLED in config)
+    # download_cross_encoder("cross-encoder/ms-marco-MiniLM-L-6-v2", "../agents/local_models/ms-marco-MiniLM-L-6-v2")
+
+    # To run the embedding model with ONNX Runtime (EMBED_BACKEND in config)
+    # export_onnx_model(model_dir, quantization="avx2")
+    # check_onnx_parity(model_dir, ["How many days of annual leave do I get?", "Employees are entitled to 14 days of annual leave."], file_name="onnx/model_qint8_avx2.onnx")
+
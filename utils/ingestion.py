@@ -0,0 +1,516 @@
+import os
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from langchain.schema import Document
+from chromadb.api.models.Collection import Collection
+from sqlalchemy import insert, delete
+from sqlmodel import select
+from config import COLLECTION_CATEGORIES, INGEST_BATCH_SIZE, PDF_LOAD_WORKERS
+from database import get_session_direct
+from exceptions import IngestionBatchException
+from logger import get_logger
+from models import ChunkDB, DocumentDB, IngestionCheckpointDB
+from utils import sg_datetime
+from utils.answer_cache import answer_cache
+from utils.chroma_db import ChunkingUtils, CollectionUtils, chunking_helper, collection_helper, list_source_files
+
+logger = get_logger(__name__)
+
+def infer_category(source: str) -> Optional[str]:
+    """
+    Infer policy category from a file name, e.g. 'Fake HR Policy Handbook.pdf' -> 'HR'.
+
+    Args:
+        source (str): Path of the source file.
+
+    Returns:
+        Optional[str]: Matching entry of COLLECTION_CATEGORIES, None if no entry matches.
+    """
+    words = {word.upper() for word in re.split(r"[^A-Za-z0-9]+", os.path.basename(source))}
+    for category in COLLECTION_CATEGORIES:
+        if category.upper() in words:
+            return category
+    return None
+
+def _batched(iterable: Iterable, n: int) -> Iterator[List]:
+    """ Yield successive lists of at most n items. """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+def _timed(iterable: Iterable, stats: "IngestionStats", stage: str) -> Iterator:
+    """ Pass items through, adding the time spent producing each one to a stage. """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        stats.add(stage, 1, time.perf_counter() - start)
+        yield item
+
+class IngestionStats:
+    """ Item counts and wall time spent in each ingestion stage. """
+
+    def __init__(self):
+        self.counts: Dict[str, int] = defaultdict(int)
+        self.seconds: Dict[str, float] = defaultdict(float)
+
+    def add(self, stage: str, count: int, seconds: float) -> None:
+        self.counts[stage] += count
+        self.seconds[stage] += seconds
+
+    def rate(self, stage: str) -> float:
+        """ Items per second of a stage. """
+        return self.counts[stage] / self.seconds[stage] if self.seconds[stage] > 0 else 0.0
+
+    def report(self) -> str:
+        """ One line per stage with count, time and throughput. """
+        units = {"load": "docs", "filter": "docs", "split": "chunks", "embed": "embeds", "add": "chunks"}
+        return "\n".join(
+            f"{stage:<7}{self.counts[stage]:>8} {units.get(stage, 'items'):<7}"
+            f"{self.seconds[stage]:>9.2f}s {self.rate(stage):>10.1f} {units.get(stage, 'items')}/sec"
+            for stage in self.counts
+        )
+
+@dataclass
+class _PendingDoc:
+    """ A document whose chunks are queued for adding. Positions are in the chunk stream. """
+    start: int
+    end: int
+    doc_hash: str
+    source: str
+    skipped: int # chunks committed by an earlier, interrupted run
+    total: int
+
+class IngestionPipeline:
+    """
+    Streaming ingestion from pdf and docx files on disk into a Chroma collection.
+
+    Documents flow through load -> hash/filter -> split -> generate_chunk_ids -> embed -> add
+    as generators, and chunks are pushed to the collection in fixed-size batches. Only one
+    batch of chunks plus the files in flight in the loader are held in memory at a time, and
+    the loader is only pulled from once the previous batch has been added. A document's hash
+    is recorded in DocumentDB as soon as its last chunk has been added, together with the
+    fingerprint of its file so unchanged files are skipped before parsing on the next run.
+    Edited documents are re-indexed chunk by chunk instead of being added in full.
+
+    Chunks are routed to the partition of their category when the collection utils
+    partition by category, see `CollectionUtils.partition_name`.
+
+    Progress of each file is checkpointed in IngestionCheckpointDB after every batch, so an
+    interrupted run resumes from the last committed batch of each document. Item counts and
+    time per stage of the last run are kept in `last_stats`.
+
+    Args:
+        chunking_utils (ChunkingUtils): Helper used to load, filter and split documents.
+        collection_utils (CollectionUtils): Helper used to embed and add chunks.
+        batch_size (int): Number of chunks added to the collection per batch.
+        max_workers (Optional[int]): Worker processes used to parse files.
+    """
+
+    def __init__(
+        self,
+        chunking_utils: ChunkingUtils,
+        collection_utils: CollectionUtils,
+        batch_size: int = INGEST_BATCH_SIZE,
+        max_workers: Optional[int] = PDF_LOAD_WORKERS,
+    ):
+        self.chunking_utils = chunking_utils
+        self.collection_utils = collection_utils
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.last_stats = IngestionStats()
+
+    def _get_or_create_collection(self, collection_name: str) -> Collection:
+        """ Get collection, creating it first if it does not exist yet. """
+        return self.collection_utils.get_or_create_collection(collection_name)
+
+    def _partitions(self, collection_name: str) -> List[Collection]:
+        """ Base collection and every category partition of it, created if missing. """
+        return [self._get_or_create_collection(name) for name in self.collection_utils.partition_names(collection_name)]
+
+    def _new_documents(
+        self,
+        documents: Iterable[Document],
+        category: Optional[str],
+        fingerprints: Dict[str, Dict]
+    ) -> Iterator[Tuple[Document, List[str]]]:
+        """
+        Hash/filter stage. Drops documents already in DocumentDB and tags category.
+        Yields each new document with the hashes of earlier versions of the same source.
+        """
+        for group in _batched(documents, self.batch_size):
+            start = time.perf_counter()
+            new_docs, _, new_sources = self.chunking_utils.filter_new_documents(group)
+            old_hashes = self.collection_utils.document_hashes_by_source(new_sources)
+            self.last_stats.add("filter", len(group), time.perf_counter() - start)
+
+            # file bytes changed but text did not, nothing to add
+            new_source_set = set(new_sources)
+            self.chunking_utils.record_file_fingerprints([
+                fingerprints[source] for doc in group
+                if (source := doc.metadata.get("source")) not in new_source_set and source in fingerprints
+            ])
+
+            for doc in new_docs:
+                doc_category = category or infer_category(doc.metadata.get("source", ""))
+                if doc_category:
+                    doc.metadata["category"] = doc_category
+                else:
+                    logger.warning(f"No category found for {doc.metadata.get('source')}")
+                yield doc, old_hashes.get(doc.metadata.get("source"), [])
+
+    def _chunks(
+        self,
+        documents: Iterable[Tuple[Document, List[str]]]
+    ) -> Iterator[Tuple[List[Document], str, str, List[str]]]:
+        """ Split and id stage. Yields the chunks of one document with its hash, source and old hashes. """
+        for doc, old_hashes in documents:
+            start = time.perf_counter()
+            chunks = self.chunking_utils.split_documents([doc])
+            chunks = self.collection_utils.generate_chunk_ids(chunks)
+            self.last_stats.add("split", len(chunks), time.perf_counter() - start)
+            yield chunks, doc.metadata["doc_hash"], doc.metadata.get("source", "unknown"), old_hashes
+
+    def ingest_files(
+        self,
+        file_paths: List[str],
+        collection_name: str,
+        category: Optional[str] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> Dict[str, int]:
+        """
+        Ingest pdf and docx files into a collection.
+
+        Args:
+            file_paths (List[str]): Paths of pdfs or docx files to ingest.
+            collection_name (str): Name of collection to add chunks to. Created if missing.
+            category (Optional[str]): Category for every document. Inferred from file name if None.
+            should_stop (Optional[Callable[[], bool]]): Checked between documents and batches. Once it
+                returns True, chunks not yet flushed are dropped and the run ends. Committed batches
+                are checkpointed, so the next run resumes from them.
+
+        Returns:
+            stats (Dict[str, int]): Counts of new documents, chunks, batches added and documents re-indexed.
+        """
+        stats = {"documents": 0, "chunks": 0, "batches": 0, "reindexed": 0}
+        self.last_stats = IngestionStats()
+
+        # skip unchanged files before any parsing
+        file_paths, fingerprints = self.chunking_utils.filter_changed_files(file_paths)
+        if not file_paths:
+            logger.info(f"No new or changed files to ingest into '{collection_name}'.")
+            return stats
+
+        buffer: List[Document] = []
+        pending_docs: List[_PendingDoc] = []
+        enqueued = 0
+        flushed = 0
+        stopped = False
+
+        def stopping() -> bool:
+            nonlocal stopped
+            stopped = stopped or (should_stop is not None and should_stop())
+            return stopped
+
+        def flush(n: int) -> None:
+            nonlocal buffer, pending_docs, flushed
+            batch = buffer[:n]
+            flushed_after = flushed + len(batch)
+            done = [doc for doc in pending_docs if doc.end <= flushed_after]
+
+            start = time.perf_counter()
+            embeddings = self.collection_utils.embed_texts([chunk.page_content for chunk in batch])
+            self.last_stats.add("embed", len(batch), time.perf_counter() - start)
+
+            start = time.perf_counter()
+            added = self.collection_utils.add_documents_by_partition(
+                collection_name=collection_name,
+                chunks=batch,
+                new_hashes=[doc.doc_hash for doc in done],
+                new_sources=[doc.source for doc in done],
+                embeddings=embeddings
+            )
+            self.last_stats.add("add", len(batch), time.perf_counter() - start)
+            if not added:
+                # checkpoints still point at the last committed batch
+                raise IngestionBatchException(collection_name, stats["batches"] + 1)
+
+            buffer, flushed = buffer[n:], flushed_after
+            touched = [doc for doc in pending_docs if doc.start < flushed or doc in done]
+            self._save_checkpoints(collection_name, [
+                (doc.source, doc.doc_hash, doc.total, doc.skipped + min(doc.end, flushed) - doc.start, doc in done)
+                for doc in touched
+            ])
+            pending_docs = [doc for doc in pending_docs if doc not in done]
+            self.chunking_utils.record_file_fingerprints(
+                [fingerprints[doc.source] for doc in done if doc.source in fingerprints]
+            )
+            stats["batches"] += 1
+            stats["chunks"] += len(batch)
+            stats["documents"] += len(done)
+            logger.info(f"Ingested batch {stats['batches']}: {stats['chunks']} chunk(s), {stats['documents']} document(s) so far.")
+
+        documents = _timed(
+            self.chunking_utils.iter_files_to_document(file_paths, max_workers=self.max_workers),
+            self.last_stats, "load"
+        )
+        # BM25 indexes and flat collections are written once at the end of the run, not after every batch
+        with self.collection_utils.deferred_saves(self.collection_utils.partition_names(collection_name)):
+            for chunks, doc_hash, source, old_hashes in self._chunks(self._new_documents(documents, category, fingerprints)):
+                if stopping():
+                    break
+                if old_hashes:
+                    # edited document, only re-embed chunks whose text changed
+                    doc_category = chunks[0].metadata.get("category") if chunks else None
+                    collection = self._get_or_create_collection(
+                        self.collection_utils.partition_name(collection_name, doc_category)
+                    )
+                    # raises before the fingerprint is recorded, so a failed re-index is retried next run
+                    counts = self.collection_utils.collection_reindex_document(
+                        collection, chunks, doc_hash, source, old_hashes,
+                        old_collections=self._partitions(collection_name),
+                        base_collection=collection_name
+                    )
+                    if source in fingerprints:
+                        self.chunking_utils.record_file_fingerprints([fingerprints[source]])
+                    stats["reindexed"] += 1
+                    stats["chunks"] += counts["added"]
+                    continue
+
+                skipped = self._committed_chunks(source, doc_hash)
+                if skipped:
+                    logger.info(f"Resuming {source} after {skipped} of {len(chunks)} committed chunk(s).")
+                self._save_checkpoints(collection_name, [(source, doc_hash, len(chunks), skipped, False)])
+
+                buffer.extend(chunks[skipped:])
+                pending_docs.append(_PendingDoc(enqueued, enqueued + len(chunks) - skipped, doc_hash, source, skipped, len(chunks)))
+                enqueued += len(chunks) - skipped
+                while len(buffer) >= self.batch_size and not stopping():
+                    flush(self.batch_size)
+
+            if (buffer or pending_docs) and not stopped:
+                flush(len(buffer))
+
+        if stopped:
+            logger.info(f"Ingestion into '{collection_name}' stopped after {stats['batches']} batch(es), the next run resumes: {stats}")
+            return stats
+        logger.info(f"Ingestion into '{collection_name}' complete: {stats}\n{self.last_stats.report()}")
+        return stats
+
+    def _committed_chunks(self, source: str, doc_hash: str) -> int:
+        """ Number of leading chunks of a document committed by an interrupted run. """
+        with get_session_direct() as session:
+            checkpoint = session.get(IngestionCheckpointDB, source)
+        if checkpoint and checkpoint.doc_hash == doc_hash and checkpoint.status == "in_progress":
+            return checkpoint.committed_chunks
+        return 0
+
+    def _save_checkpoints(self, collection_name: str, checkpoints: List[Tuple[str, str, int, int, bool]]) -> None:
+        """ Upsert (source, doc_hash, total_chunks, committed_chunks, done) checkpoints of a collection. """
+        if not checkpoints:
+            return
+        modified_at = sg_datetime.get_sgt_time()
+        records = [
+            {
+                "source": source,
+                "doc_hash": doc_hash,
+                "collection": collection_name,
+                "total_chunks": total,
+                "committed_chunks": committed,
+                "status": "done" if done else "in_progress",
+                "modified_at": modified_at,
+            }
+            for source, doc_hash, total, committed, done in checkpoints
+        ]
+        with get_session_direct() as session:
+            session.execute(insert(IngestionCheckpointDB).prefix_with("OR REPLACE"), records)
+            session.commit()
+
+    def repartition(self, collection_name: str) -> int:
+        """
+        Move chunks of known categories from the base collection into their category partitions.
+
+        Collections built before partitioning was enabled hold every category in one collection.
+        Chunks are moved with their stored embeddings, nothing is embedded again.
+
+        Args:
+            collection_name (str): Base collection name.
+
+        Returns:
+            int: Number of chunks moved.
+        """
+        if not self.collection_utils.partition_by_category:
+            return 0
+        collection = self.collection_utils.get_collection(collection_name)
+        if collection is None:
+            return 0
+
+        moved, page_size = 0, 1000
+        where = {"category": {"$in": list(self.collection_utils.categories)}}
+        with self.collection_utils.deferred_saves(self.collection_utils.partition_names(collection_name)):
+            while True:
+                page = collection.get(where=where, include=["documents", "metadatas", "embeddings"], limit=page_size)
+                if not page["ids"]:
+                    break
+                chunks = [
+                    Document(page_content=document, metadata=metadata)
+                    for document, metadata in zip(page["documents"], page["metadatas"])
+                ]
+                if not self.collection_utils.add_documents_by_partition(
+                    collection_name, chunks, [], [], embeddings=list(page["embeddings"])
+                ):
+                    raise IngestionBatchException(collection_name, moved // page_size + 1)
+                collection.delete(ids=page["ids"])
+                if (index := self.collection_utils.get_sparse_index(collection_name)) is not None:
+                    index.remove(page["ids"])
+                moved += len(page["ids"])
+
+        if moved:
+            logger.info(f"Moved {moved} chunk(s) of '{collection_name}' into category partitions.")
+        return moved
+
+    def reconcile(self, collection_name: str) -> Dict[str, int]:
+        """
+        Bring Chroma, the chunk registry and DocumentDB back in sync after a crash.
+
+        - Chunks still in the base collection that belong to a category partition are moved there.
+        - Chunks in Chroma of documents that are neither recorded nor being resumed are deleted.
+        - Recorded documents with registered chunks missing from Chroma are removed, so their
+          files are ingested again.
+        - Checkpoints of documents being resumed are reset if their committed chunks are missing.
+
+        Only documents recorded for this collection are checked, documents of other collections
+        are neither missing here nor is their chunk registry stale.
+
+        Args:
+            collection_name (str): Name of collection to reconcile.
+
+        Returns:
+            Dict[str, int]: Number of chunks moved to partitions, orphan chunks deleted,
+                documents dropped and checkpoints reset.
+        """
+        moved = self.repartition(collection_name)
+        collections = self._partitions(collection_name)
+
+        with get_session_direct() as session:
+            known_hashes = set(session.exec(
+                select(DocumentDB.hash).where(DocumentDB.collection == collection_name)
+            ).all())
+            in_progress = {
+                checkpoint.doc_hash: checkpoint
+                for checkpoint in session.exec(
+                    select(IngestionCheckpointDB).where(
+                        IngestionCheckpointDB.status == "in_progress",
+                        IngestionCheckpointDB.collection == collection_name
+                    )
+                ).all()
+            }
+            # registry rows are only stale if no collection knows their document
+            any_live_hashes = set(session.exec(select(DocumentDB.hash)).all()) | set(session.exec(
+                select(IngestionCheckpointDB.doc_hash).where(IngestionCheckpointDB.status == "in_progress")
+            ).all())
+            registry = session.exec(select(ChunkDB.chunk_id, ChunkDB.doc_hash)).all()
+        live_hashes = known_hashes | set(in_progress)
+
+        chroma_hashes = {}
+        orphan_ids_by_collection: Dict[str, List[str]] = defaultdict(list)
+        page_size = 1000
+        for collection in collections:
+            offset = 0
+            while True:
+                page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                for chunk_id, metadata in zip(page["ids"], page["metadatas"]):
+                    chroma_hashes[chunk_id] = (metadata or {}).get("doc_hash")
+                    if chroma_hashes[chunk_id] not in live_hashes:
+                        orphan_ids_by_collection[collection.name].append(chunk_id)
+                if len(page["ids"]) < page_size:
+                    break
+                offset += page_size
+
+        stale_rows = [chunk_id for chunk_id, doc_hash in registry if doc_hash not in any_live_hashes]
+        missing_hashes = {
+            doc_hash for chunk_id, doc_hash in registry
+            if doc_hash in live_hashes and chunk_id not in chroma_hashes
+        }
+
+        for collection in collections:
+            orphan_ids = orphan_ids_by_collection.get(collection.name, [])
+            for start in range(0, len(orphan_ids), 500):
+                collection.delete(ids=orphan_ids[start:start + 500])
+            if orphan_ids and (index := self.collection_utils.get_sparse_index(collection.name)) is not None:
+                index.remove(orphan_ids)
+        orphan_hashes = {chroma_hashes[chunk_id] for ids in orphan_ids_by_collection.values() for chunk_id in ids}
+        answer_cache.invalidate_documents([doc_hash for doc_hash in orphan_hashes if doc_hash])
+        with get_session_direct() as session:
+            for start in range(0, len(stale_rows), 500):
+                session.execute(delete(ChunkDB).where(ChunkDB.chunk_id.in_(stale_rows[start:start + 500])))
+            session.commit()
+
+        broken_docs = [doc_hash for doc_hash in missing_hashes if doc_hash in known_hashes]
+        if broken_docs:
+            self.collection_utils.collection_delete_documents(collections, broken_docs)
+
+        reset = [in_progress[doc_hash] for doc_hash in missing_hashes if doc_hash in in_progress]
+        self._save_checkpoints(collection_name, [
+            (checkpoint.source, checkpoint.doc_hash, checkpoint.total_chunks, 0, False) for checkpoint in reset
+        ])
+
+        counts = {
+            "repartitioned_chunks": moved,
+            "orphan_chunks": sum(len(ids) for ids in orphan_ids_by_collection.values()),
+            "documents_dropped": len(broken_docs),
+            "checkpoints_reset": len(reset),
+        }
+        logger.info(f"Reconciled '{collection_name}' with SQLite: {counts}")
+        return counts
+
+    def remove_files(self, file_paths: List[str], collection_name: str) -> int:
+        """
+        Remove every document ingested from the given files.
+
+        Args:
+            file_paths (List[str]): Paths of files that were removed from disk.
+            collection_name (str): Name of collection to remove chunks from.
+
+        Returns:
+            int: Number of documents removed.
+        """
+        hashes_by_source = self.collection_utils.document_hashes_by_source([os.path.abspath(path) for path in file_paths])
+        hashes = [h for source_hashes in hashes_by_source.values() for h in source_hashes]
+        if not hashes:
+            return 0
+
+        self.collection_utils.collection_delete_documents(self._partitions(collection_name), hashes)
+        logger.info(f"Removed {len(hashes)} document(s) of {len(hashes_by_source)} file(s) from '{collection_name}'.")
+        return len(hashes)
+
+    def ingest_directory(
+        self,
+        dir_path: str,
+        collection_name: str,
+        category: Optional[str] = None
+    ) -> Dict[str, int]:
+        """
+        Ingest every pdf and docx in a directory (recursively) into a collection.
+
+        Args:
+            dir_path (str): Directory containing pdfs or docx files.
+            collection_name (str): Name of collection to add chunks to. Created if missing.
+            category (Optional[str]): Category for every document. Inferred from file name if None.
+
+        Returns:
+            stats (Dict[str, int]): Counts of new documents, chunks, batches added and documents re-indexed.
+        """
+        return self.ingest_files(list_source_files(dir_path), collection_name, category=category)
+
+
+ingestion_pipeline = IngestionPipeline(chunking_helper, collection_helper)
+
+__all__ = ["ingestion_pipeline", "IngestionPipeline", "infer_category"]
@@ -0,0 +1,243 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from config import (
+    DOCUMENTS_DIR, POLICY_COLLECTION_NAME,
+    WATCH_POLL_INTERVAL, WATCH_DEBOUNCE_SECONDS, WATCH_LOCK_PATH, WATCH_STOP_TIMEOUT
+)
+from sqlmodel import select
+from database import get_session_direct
+from logger import get_logger
+from models import FileFingerprintDB
+from utils.chroma_db import chunking_helper, collection_helper, list_source_files
+from utils.ingestion import IngestionPipeline
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, every process then runs its own watcher
+    fcntl = None
+
+logger = get_logger(__name__)
+
+class DocumentWatcher:
+    """
+    Background worker that keeps a collection in sync with a documents directory.
+
+    The directory is scanned every `poll_interval` seconds. If the optional `watchdog`
+    package is installed, inotify (or the platform equivalent) events wake the worker up
+    early. Bursts of changes are debounced: once the directory has been quiet for
+    `debounce_seconds`, only added, changed or removed files are pushed through the
+    ingestion pipeline. Queries keep using the live collection in the meantime. Files that
+    failed to ingest stay out of sync and are retried, starting after `poll_interval` seconds
+    and backing off while they keep failing.
+
+    Every API worker process starts a watcher, but only the one holding an exclusive lock on
+    `lock_path` syncs. The others wait for the lock, so a watcher takes over if its owner exits.
+
+    Args:
+        pipeline (IngestionPipeline): Pipeline used to ingest and remove files.
+        dir_path (str): Directory to watch, recursively.
+        collection_name (str): Name of collection to keep in sync.
+        poll_interval (float): Seconds between scans.
+        debounce_seconds (float): Quiet period required before ingesting.
+        lock_path (Optional[str]): File locked by the process running the watcher. No lock if None.
+    """
+
+    def __init__(
+        self,
+        pipeline: IngestionPipeline,
+        dir_path: str,
+        collection_name: str,
+        poll_interval: float = WATCH_POLL_INTERVAL,
+        debounce_seconds: float = WATCH_DEBOUNCE_SECONDS,
+        lock_path: Optional[str] = WATCH_LOCK_PATH,
+    ):
+        self.pipeline = pipeline
+        self.dir_path = os.path.abspath(dir_path)
+        self.collection_name = collection_name
+        self.poll_interval = poll_interval
+        self.debounce_seconds = debounce_seconds
+        self.lock_path = lock_path
+
+        self._lock_file = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._observer = None
+
+    def _snapshot(self) -> Dict[str, Tuple[int, float]]:
+        """ Size and mtime of every supported file in the directory. """
+        snapshot = {}
+        for file_path in list_source_files(self.dir_path):
+            try:
+                stat = os.stat(file_path)
+                snapshot[file_path] = (stat.st_size, stat.st_mtime)
+            except OSError:
+                continue  # removed between listing and stat
+        return snapshot
+
+    def _ingested_snapshot(self) -> Dict[str, Tuple[int, float]]:
+        """ Size and mtime of files under the directory as last ingested, from their fingerprints. """
+        prefix = os.path.join(self.dir_path, "")
+        with get_session_direct() as session:
+            records = session.exec(
+                select(FileFingerprintDB).where(FileFingerprintDB.path.startswith(prefix))
+            ).all()
+        return {record.path: (record.size, record.mtime) for record in records}
+
+    def _acquire_lock(self) -> bool:
+        """ Try to become the only process running the watcher. """
+        if self.lock_path is None or fcntl is None:
+            return True
+        lock_file = open(self.lock_path, "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release_lock(self) -> None:
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _start_observer(self) -> None:
+        """ Wake the worker on file system events if watchdog is available. """
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.info(f"watchdog not installed, polling '{self.dir_path}' every {self.poll_interval}s.")
+            return
+
+        wakeup = self._wakeup
+
+        class _WakeupHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wakeup.set()
+
+        self._observer = Observer()
+        self._observer.schedule(_WakeupHandler(), self.dir_path, recursive=True)
+        self._observer.start()
+        logger.info(f"Watching '{self.dir_path}' for file system events.")
+
+    def sync(
+        self,
+        previous: Dict[str, Tuple[int, float]],
+        current: Dict[str, Tuple[int, float]]
+    ) -> Dict[str, Tuple[int, float]]:
+        """
+        Push the difference between two snapshots through the ingestion pipeline.
+
+        Args:
+            previous (Dict): Snapshot already in sync with the collection.
+            current (Dict): Latest snapshot of the directory.
+
+        Returns:
+            Dict: Snapshot now in sync with the collection. Files that failed to ingest or be
+                removed keep their previous state, so they differ from `current` and are retried.
+        """
+        changed = [path for path, stat in current.items() if previous.get(path) != stat]
+        removed = [path for path in previous if path not in current]
+
+        if removed:
+            self.pipeline.remove_files(removed, self.collection_name)
+        if changed:
+            self.pipeline.ingest_files(changed, self.collection_name, should_stop=self._stop.is_set)
+
+        # fingerprints are only recorded for ingested files and deleted with removed ones
+        ingested = self._ingested_snapshot()
+        synced = {path: stat for path, stat in current.items() if ingested.get(path) == stat}
+        synced.update({path: stat for path, stat in previous.items() if path not in synced and path in ingested})
+        failed = [path for path in changed + removed if synced.get(path) != current.get(path)]
+
+        logger.info(f"Synced '{self.dir_path}': {len(changed)} added/changed, {len(removed)} removed, {len(failed)} failed.")
+        if failed:
+            logger.warning(f"Failed to sync, will retry: {failed}")
+        return synced
+
+    def _run(self) -> None:
+        """ Worker loop: wait for the lock, then scan, debounce, sync. """
+        while not self._acquire_lock():
+            if self._stop.wait(timeout=self.poll_interval):
+                return
+        logger.info(f"Document watcher on '{self.dir_path}' is syncing in process {os.getpid()}.")
+        self._start_observer()
+
+        # start from what was ingested before startup so offline edits and removals are picked up
+        synced = self._ingested_snapshot()
+        latest = self._snapshot()
+        next_sync = 0.0
+        retry_delay = self.poll_interval
+
+        while not self._stop.is_set():
+            if latest != synced and time.monotonic() >= next_sync:
+                try:
+                    synced = self.sync(synced, latest)
+                except Exception as e:
+                    logger.error(f"Failed to sync '{self.dir_path}': {e}")
+                # whatever is still out of sync failed, retry it later and back off while it keeps failing
+                if latest != synced:
+                    next_sync = time.monotonic() + retry_delay
+                    retry_delay = min(retry_delay * 2, self.poll_interval * 32)
+                else:
+                    retry_delay = self.poll_interval
+
+            timeout = min(self.poll_interval, max(0.0, next_sync - time.monotonic())) if latest != synced else self.poll_interval
+            self._wakeup.wait(timeout=timeout)
+            self._wakeup.clear()
+
+            snapshot = self._snapshot()
+            if snapshot != latest:
+                latest = snapshot
+                next_sync = time.monotonic() + self.debounce_seconds
+
+    def start(self) -> None:
+        """ Start watching in a daemon thread. """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="document-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Document watcher started on '{self.dir_path}'.")
+
+    def stop(self, timeout: float = WATCH_STOP_TIMEOUT) -> None:
+        """
+        Stop the worker thread and file system observer.
+
+        A sync in progress stops after its current batch, the rest is ingested on the next start.
+
+        Args:
+            timeout (float): Seconds to wait for the worker. If it is still running afterwards, the
+                lock stays held until the process exits so no other watcher syncs alongside it.
+        """
+        self._stop.set()
+        self._wakeup.set()
+        # the worker starts the observer, join it first so none is started after this check
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            if self._thread.is_alive():
+                logger.warning(f"Document watcher on '{self.dir_path}' did not stop within {timeout}s, leaving it to exit with the process.")
+            else:
+                self._thread = None
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        if self._thread is None:
+            self._release_lock()
+        logger.info(f"Document watcher on '{self.dir_path}' stopped.")
+
+
+# single process pipeline, a watcher only handles a few files at a time
+document_watcher = DocumentWatcher(
+    pipeline=IngestionPipeline(chunking_helper, collection_helper, max_workers=None),
+    dir_path=DOCUMENTS_DIR,
+    collection_name=POLICY_COLLECTION_NAME,
+)
+
+__all__ = ["document_watcher", "DocumentWatcher"]
@@ -0,0 +1,193 @@
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
+from langchain_core.messages import BaseMessage, HumanMessage
+from config import (
+    INTENT_CONFIDENCE_THRESHOLD, INTENT_SOFTMAX_TEMPERATURE,
+    SAME_POLICY_SIMILARITY, DIFFERENT_POLICY_SIMILARITY
+)
+from logger import get_logger
+from models import IntentEnum, RoleEnum
+from utils.chroma_db import collection_helper
+
+logger = get_logger(__name__)
+
+# Labeled examples of each class, new policy questions and follow-ups are told apart
+# here and compared against the previous user turn afterwards.
+NON_POLICY = "non-policy"
+POLICY_QUESTION = "policy question"
+FOLLOW_UP = "follow-up"
+
+INTENT_EXAMPLES: Dict[str, List[str]] = {
+    NON_POLICY: [
+        "hi", "hello", "hey there", "good morning", "good afternoon", "good evening",
+        "thanks", "thank you", "thanks a lot", "ok thanks", "great, thank you", "bye", "goodbye",
+        "see you", "how are you?", "who are you?", "what can you do?", "nice", "cool", "ok",
+        "what is the weather today?", "tell me a joke", "what time is it?", "lol",
+    ],
+    POLICY_QUESTION: [
+        "How many days of annual leave do I get?",
+        "What is the policy on sick leave?",
+        "Can I work from home?",
+        "How do I claim travel expenses?",
+        "What is the password policy?",
+        "Am I allowed to install software on my laptop?",
+        "What is the maternity leave entitlement?",
+        "How do I report a lost company laptop?",
+        "What is the limit for client entertainment expenses?",
+        "Can I use my personal phone for work email?",
+        "How many hours of overtime can I claim?",
+        "What is the notice period for resignation?",
+        "What are the rules for business class travel?",
+        "How do I request access to a shared drive?",
+    ],
+    FOLLOW_UP: [
+        "What about for managers?",
+        "And if I am a contract employee?",
+        "Does that apply in Singapore too?",
+        "Can you explain that in more detail?",
+        "What if I exceed that limit?",
+        "Is there an exception for that?",
+        "How about part-time staff?",
+        "I am an executive in the finance department.",
+        "I am based in the Singapore office.",
+        "Does this also apply to interns?",
+        "What happens if I don't?",
+        "Who do I need to get approval from for that?",
+    ],
+}
+
+def _last_user_turn(chat_history: List[Any]) -> Optional[str]:
+    """ Content of the latest user message in a history of BaseMessages or {role: content} dicts. """
+    for item in reversed(chat_history):
+        if isinstance(item, BaseMessage):
+            if isinstance(item, HumanMessage):
+                return item.content
+        elif isinstance(item, dict):
+            for role, content in item.items():
+                if role == RoleEnum.USER:
+                    return content
+    return None
+
+class LocalIntentClassifier:
+    """
+    Nearest-centroid intent classifier over the embedding model already loaded for retrieval.
+
+    Messages are embedded with `CollectionUtils.embed_texts`, so repeated messages such as
+    greetings come from the embedding cache. The message is scored against the centroid of
+    each class in INTENT_EXAMPLES, and the softmax of those similarities is the confidence.
+    A policy question is classified as the same or a different policy by its similarity to
+    the previous user turn. `classify` returns None whenever confidence is too low so the
+    caller can fall back to the LLM. Callers report through `record` whether an LLM call was
+    skipped, which is what `stats` counts as a local hit.
+
+    Args:
+        examples (Dict[str, List[str]]): Labeled example messages per class.
+        confidence_threshold (float): Minimum softmax probability of the top class.
+        temperature (float): Softmax temperature applied to cosine similarities.
+        same_policy_similarity (float): Similarity to previous user turn at or above which a
+            question is about the same policy.
+        different_policy_similarity (float): Similarity at or below which it is about a different policy.
+    """
+
+    def __init__(
+        self,
+        examples: Dict[str, List[str]] = INTENT_EXAMPLES,
+        confidence_threshold: float = INTENT_CONFIDENCE_THRESHOLD,
+        temperature: float = INTENT_SOFTMAX_TEMPERATURE,
+        same_policy_similarity: float = SAME_POLICY_SIMILARITY,
+        different_policy_similarity: float = DIFFERENT_POLICY_SIMILARITY,
+    ):
+        self.examples = examples
+        self.confidence_threshold = confidence_threshold
+        self.temperature = temperature
+        self.same_policy_similarity = same_policy_similarity
+        self.different_policy_similarity = different_policy_similarity
+        self._labels: List[str] = list(examples)
+        self._centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.llm_fallbacks = 0
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(collection_helper.embed_texts(texts), dtype=np.float32)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def _get_centroids(self) -> np.ndarray:
+        """ Embed the labeled examples once and average them per class. """
+        with self._lock:
+            if self._centroids is None:
+                centroids = np.stack([self._embed(self.examples[label]).mean(axis=0) for label in self._labels])
+                self._centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+            return self._centroids
+
+    def record(self, llm_call_skipped: bool) -> None:
+        """
+        Count a classified message for `stats`. Callers decide whether the local result saved
+        an LLM call, a confident label that still needs the same call is not a hit.
+        """
+        with self._lock:
+            if llm_call_skipped:
+                self.local_hits += 1
+            else:
+                self.llm_fallbacks += 1
+
+    def classify(self, message: str, chat_history: List[Any]) -> Optional[str]:
+        """
+        Classify a user message into an IntentEnum value.
+
+        Args:
+            message (str): The user's most recent message.
+            chat_history (List[Any]): Effective chat history, BaseMessages or {role: content} dicts.
+
+        Returns:
+            Optional[str]: IntentEnum value, None if the classifier is not confident enough.
+        """
+        if message.strip().lower() == "exit":
+            return IntentEnum.END.value
+
+        try:
+            previous = _last_user_turn(chat_history)
+            vectors = self._embed([message] if previous is None else [message, previous])
+            similarities = self._get_centroids() @ vectors[0]
+        except Exception as e:
+            logger.warning(f"Local intent classification failed: {e}")
+            return None
+
+        logits = similarities / self.temperature
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        best = int(np.argmax(probabilities))
+        label, confidence = self._labels[best], float(probabilities[best])
+        logger.debug(f"Local intent '{label}' with confidence {confidence:.2f}")
+
+        if confidence < self.confidence_threshold:
+            return None
+        if label == NON_POLICY:
+            return IntentEnum.NON_POLICY_RELATED.value
+        if previous is None:
+            # nothing to follow up on, details are checked next either way
+            return IntentEnum.POLICY_RELATED.value
+        if label == FOLLOW_UP:
+            return IntentEnum.SAME_POLICY.value
+
+        similarity = float(vectors[0] @ vectors[1])
+        if similarity >= self.same_policy_similarity:
+            return IntentEnum.SAME_POLICY.value
+        if similarity <= self.different_policy_similarity:
+            return IntentEnum.DIFFERENT_POLICY.value
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        """ Messages whose LLM call was skipped by the local classifier, and those that still needed it, in this process. """
+        total = self.local_hits + self.llm_fallbacks
+        return {
+            "local_hits": self.local_hits,
+            "llm_fallbacks": self.llm_fallbacks,
+            "hit_rate": self.local_hits / total if total else 0.0,
+        }
+
+
+intent_classifier = LocalIntentClassifier()
+
+__all__ = ["intent_classifier", "LocalIntentClassifier", "INTENT_EXAMPLES"]
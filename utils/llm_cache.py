@@ -0,0 +1,167 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from langchain_core.caches import BaseCache, RETURN_VAL_TYPE
+from langchain_core.load import dumps, loads
+from config import LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL_SECONDS
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+class LLMResponseCache(BaseCache):
+    """
+    Exact-match cache of LLM responses for deterministic (temperature 0) models.
+
+    LangChain calls `lookup` and `update` with the serialized prompt messages and an
+    `llm_string` describing the model, its parameters and any bound tools, so entries are
+    keyed by sha256 of both. Entries live in an in-memory LRU and, when `cache_path` is set,
+    in a SQLite file shared across processes and restarts. Entries older than `ttl_seconds`
+    are treated as misses, and the least recently used ones are evicted past `max_entries`.
+
+    Args:
+        cache_path (Optional[str]): Path to the SQLite file backing the cache. Memory only if None.
+        max_entries (int): Maximum number of responses kept in memory and on disk.
+        ttl_seconds (Optional[float]): Age after which a response is no longer used. No expiry if None.
+    """
+
+    def __init__(self, cache_path: Optional[str], max_entries: int, ttl_seconds: Optional[float]):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._conn = None
+        if cache_path:
+            self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                "key TEXT PRIMARY KEY, generations TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        """ Content address of a prompt for a model configuration. """
+        return hashlib.sha256(f"{llm_string}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, generations: str) -> None:
+        """ Put an entry in the in-memory LRU. Caller holds the lock. """
+        self._memory[key] = (created_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """
+        Look up a cached response.
+
+        Args:
+            prompt (str): Serialized prompt messages.
+            llm_string (str): Serialized model configuration, including bound tools.
+
+        Returns:
+            Optional[RETURN_VAL_TYPE]: Cached generations, None on a miss.
+        """
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT created_at, generations FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    entry = (row[0], row[1])
+                    self._conn.execute("UPDATE llm_responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+
+            if entry is None or self._expired(entry[0]):
+                self._memory.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._remember(key, *entry)
+            self.hits += 1
+
+        # deserialise on every hit so callers never share generation objects
+        generations = [loads(generation) for generation in json.loads(entry[1])]
+        for generation in generations:
+            # replayed usage is not a measurement of this call, let callers tell hits apart
+            if (message := getattr(generation, "message", None)) is not None:
+                message.response_metadata["llm_cache_hit"] = True
+        return generations
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """
+        Store the response to a prompt.
+
+        Args:
+            prompt (str): Serialized prompt messages.
+            llm_string (str): Serialized model configuration, including bound tools.
+            return_val (RETURN_VAL_TYPE): Generations returned by the model.
+
+        Returns:
+            None
+        """
+        key = self.make_key(prompt, llm_string)
+        generations = json.dumps([dumps(generation) for generation in return_val])
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, generations)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, generations, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, generations, now, now)
+                )
+                self._evict()
+                self._conn.commit()
+
+    def _evict(self) -> None:
+        """ Remove expired entries and least recently used ones above `max_entries`. Caller holds the lock. """
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM llm_responses WHERE key IN "
+                "(SELECT key FROM llm_responses ORDER BY last_used ASC LIMIT ?)",
+                (excess,)
+            )
+            logger.info(f"Evicted {excess} LLM response(s) from cache.")
+
+    def clear(self, **kwargs: Any) -> None:
+        """ Remove every cached response. """
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_responses")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """ Hit/miss counters of this process. """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries_in_memory": len(self._memory),
+        }
+
+
+llm_cache = LLMResponseCache(
+    cache_path=LLM_CACHE_PATH,
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl_seconds=LLM_CACHE_TTL_SECONDS,
+)
+
+__all__ = ["llm_cache", "LLMResponseCache"]
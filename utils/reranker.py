@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import List, Optional
+from config import RERANK_MODEL_PATH, RERANK_TIME_BUDGET_MS
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+class CrossEncoderReranker:
+    """
+    CPU cross-encoder that rescores retrieved chunks against the query within a time budget.
+
+    All candidates are scored in one batch on a dedicated worker thread. Call `warmup` at startup,
+    otherwise the first query loads the model. If scoring (including loading the model on first
+    use) does not finish within `time_budget_ms`, the caller gets
+    None and should keep the retrieval order. A timed out job is cancelled if it is still queued,
+    and a job that only starts after its caller gave up returns without scoring, so stale work
+    never piles up in front of later queries. The late result of a running job is discarded.
+
+    Args:
+        model_path (str): Path to a local sentence-transformers cross-encoder.
+        time_budget_ms (int): Hard limit on time spent waiting for scores per query.
+    """
+
+    def __init__(self, model_path: str, time_budget_ms: int):
+        self.model_path = model_path
+        self.time_budget_ms = time_budget_ms
+        self._model = None
+        self._lock = threading.Lock()
+        # one worker so a slow query cannot pile up concurrent model runs
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reranker")
+        self.reranked = 0
+        self.fallbacks = 0
+
+    def _get_model(self):
+        """ Load the cross-encoder once. """
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(self.model_path, device="cpu")
+                logger.info(f"Loaded cross-encoder from {self.model_path}.")
+            return self._model
+
+    def warmup(self) -> bool:
+        """
+        Load the model on the calling thread, e.g. at startup, so no query waits for it on the
+        scoring worker. Download it first with utils/hf_models.py `download_cross_encoder`.
+
+        Returns:
+            bool: False if the model could not be loaded, queries then keep the retrieval order.
+        """
+        try:
+            self._get_model()
+            return True
+        except Exception as e:
+            logger.warning(f"Unable to load cross-encoder from {self.model_path}, keeping retrieval order: {e}")
+            return False
+
+    def _score(self, query: str, documents: List[str], deadline: float) -> Optional[List[float]]:
+        if time.monotonic() >= deadline:
+            # the caller already fell back to retrieval order
+            return None
+        return list(self._get_model().predict([(query, document) for document in documents]))
+
+    def rerank(self, query: str, documents: List[str], top_k: int) -> Optional[List[int]]:
+        """
+        Rank documents by cross-encoder relevance to the query.
+
+        Args:
+            query (str): Query from user.
+            documents (List[str]): Candidate chunk texts.
+            top_k (int): Number of indices to return.
+
+        Returns:
+            Optional[List[int]]: Indices into `documents`, most relevant first. None if the
+                time budget was exceeded or scoring failed.
+        """
+        if not documents:
+            return []
+
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.time_budget_ms / 1000
+        future = self._executor.submit(self._score, query, documents, deadline)
+        try:
+            scores = future.result(timeout=self.time_budget_ms / 1000)
+        except TimeoutError:
+            future.cancel()
+            self.fallbacks += 1
+            logger.warning(f"Reranking {len(documents)} chunk(s) exceeded {self.time_budget_ms}ms budget, keeping retrieval order.")
+            return None
+        except Exception as e:
+            self.fallbacks += 1
+            logger.warning(f"Reranking failed, keeping retrieval order: {e}")
+            return None
+
+        self.reranked += 1
+        order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)[:top_k]
+        logger.info(f"Reranked {len(documents)} chunk(s) in {(time.perf_counter() - start) * 1000:.0f}ms.")
+        return order
+
+
+reranker = CrossEncoderReranker(model_path=RERANK_MODEL_PATH, time_budget_ms=RERANK_TIME_BUDGET_MS)
+
+__all__ = ["reranker", "CrossEncoderReranker"]
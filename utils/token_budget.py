@@ -0,0 +1,206 @@
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.messages import BaseMessage, HumanMessage
+from config import (
+    LLM_TOKENIZER_PATH, LLM_CHARS_PER_TOKEN, LLM_PROMPT_TOKEN_BUDGET,
+    CONTEXT_BUDGET_SYSTEM, CONTEXT_BUDGET_SUMMARY, CONTEXT_BUDGET_HISTORY, CONTEXT_BUDGET_USER_MESSAGE
+)
+from logger import get_logger
+from models import RoleEnum
+from utils.chroma_db import get_tokenizer
+
+logger = get_logger(__name__)
+
+def _is_user_message(item: Any) -> bool:
+    """ Whether a history item, a BaseMessage or {role: content} dict, was sent by the user. """
+    if isinstance(item, BaseMessage):
+        return isinstance(item, HumanMessage)
+    return isinstance(item, dict) and RoleEnum.USER in item
+
+def _turns(history: List[Any]) -> List[List[Any]]:
+    """ Split history into turns, each a user message with the replies that follow it. """
+    turns: List[List[Any]] = []
+    for item in history:
+        if _is_user_message(item) or not turns:
+            turns.append([])
+        turns[-1].append(item)
+    return turns
+
+class TokenCounter:
+    """
+    Counts prompt tokens with the LLM's tokenizer, or estimates them from character counts.
+
+    The tokenizer is only loaded from a local directory. Without it, tokens are estimated as
+    characters / `chars_per_token`, and the ratio is calibrated online from the prompt token
+    counts the LLM API reports back through `observe`.
+
+    Args:
+        tokenizer_path (Optional[str]): Local directory of the LLM tokenizer.
+        chars_per_token (float): Initial characters per token of the estimator.
+    """
+
+    def __init__(self, tokenizer_path: Optional[str], chars_per_token: float):
+        self.tokenizer = None
+        if tokenizer_path and os.path.isdir(tokenizer_path):
+            self.tokenizer = get_tokenizer(tokenizer_path)
+        self.chars_per_token = chars_per_token
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        """ Number of tokens of a text. """
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+        return math.ceil(len(text) / self.chars_per_token)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """ Longest prefix of a text that fits in `max_tokens`. """
+        if self.count(text) <= max_tokens:
+            return text
+        if self.tokenizer is not None:
+            ids = self.tokenizer(text, add_special_tokens=False)["input_ids"][:max_tokens]
+            return self.tokenizer.decode(ids)
+        return text[:int(max_tokens * self.chars_per_token)]
+
+    def observe(self, prompt_chars: int, prompt_tokens: int) -> None:
+        """
+        Calibrate the estimator with the real token count of a prompt.
+
+        Args:
+            prompt_chars (int): Characters sent to the LLM.
+            prompt_tokens (int): Prompt tokens reported by the LLM API.
+
+        Returns:
+            None
+        """
+        if self.tokenizer is not None or prompt_chars <= 0 or prompt_tokens <= 0:
+            return
+        with self._lock:
+            # moving average so one unusual prompt does not swing the estimate
+            self.chars_per_token = 0.9 * self.chars_per_token + 0.1 * (prompt_chars / prompt_tokens)
+
+class ContextBudget:
+    """
+    Per-section token budgets of the answer prompt.
+
+    The system prompt, document summary and user message each have a budget. History gets its
+    own budget, capped by whatever the other sections leave of `total`. `fit` trims the summary
+    and history to their budgets in one pass: the summary is cut at the end and history keeps
+    its newest turns that fit, a user message always together with the replies to it. The user
+    message is kept whole in the chat history and only cut to its budget when rendered into the
+    prompt, see `cap_user_message`.
+
+    Args:
+        counter (TokenCounter): Token counter of the LLM.
+        total (int): Token budget of the whole prompt.
+        system (int): Budget of the fixed prompt template.
+        summary (int): Budget of the document summary.
+        history (int): Budget of the chat history.
+        user_message (int): Budget of the user message.
+    """
+
+    def __init__(
+        self,
+        counter: TokenCounter,
+        total: int,
+        system: int,
+        summary: int,
+        history: int,
+        user_message: int
+    ):
+        self.counter = counter
+        self.total = total
+        self.system = system
+        self.summary = summary
+        self.history = history
+        self.user_message = user_message
+
+    def _history_budget(self, system_tokens: int, summary_tokens: int, user_tokens: int) -> int:
+        fixed = system_tokens + min(summary_tokens, self.summary) + min(user_tokens, self.user_message)
+        return max(0, min(self.history, self.total - fixed))
+
+    def measure(self, system_text: str, summary: str, user_message: str, history: List[Any]) -> Dict[str, int]:
+        """
+        Token count of every section of a prompt.
+
+        History items are counted as they are rendered into the prompt, by their repr.
+
+        Returns:
+            Dict[str, int]: Tokens of system, summary, user_message, history and total.
+        """
+        sizes = {
+            "system": self.counter.count(system_text),
+            "summary": self.counter.count(summary),
+            "user_message": self.counter.count(user_message),
+            "history": sum(self.counter.count(repr(item)) for item in history),
+        }
+        sizes["total"] = sum(sizes.values())
+        return sizes
+
+    def cap_user_message(self, user_message: str) -> str:
+        """ User message cut to its budget, as rendered into the prompt. """
+        return self.counter.truncate(user_message, self.user_message)
+
+    def fits(self, system_text: str, summary: str, user_message: str, history: List[Any]) -> bool:
+        """ Whether the summary and history are within their budgets. """
+        sizes = self.measure(system_text, summary, user_message, history)
+        if sizes["system"] > self.system:
+            logger.warning(f"Prompt template uses {sizes['system']} tokens, above its budget of {self.system}")
+        logger.info(f"Prompt tokens per section: {sizes}")
+        return (
+            sizes["summary"] <= self.summary
+            and sizes["history"] <= self._history_budget(sizes["system"], sizes["summary"], sizes["user_message"])
+        )
+
+    def fit(
+        self,
+        system_text: str,
+        summary: str,
+        user_message: str,
+        history: List[Any]
+    ) -> Tuple[str, List[Any]]:
+        """
+        Trim the summary and history of a prompt to their budgets.
+
+        Args:
+            system_text (str): Fixed prompt template, never trimmed.
+            summary (str): Document summary.
+            user_message (str): The user's message.
+            history (List[Any]): Chat history, oldest first.
+
+        Returns:
+            Tuple[str, List[Any]]: Trimmed summary and history.
+        """
+        summary = self.counter.truncate(summary, self.summary)
+        budget = self._history_budget(
+            self.counter.count(system_text), self.counter.count(summary), self.counter.count(user_message)
+        )
+
+        # drop whole turns from the oldest, a reply without its question misleads the LLM
+        kept, used = 0, 0
+        for turn in reversed(_turns(history)):
+            tokens = sum(self.counter.count(repr(item)) for item in turn)
+            if used + tokens > budget:
+                break
+            kept += len(turn)
+            used += tokens
+        trimmed = history[len(history) - kept:] if kept else []
+
+        logger.info(f"Kept {kept} of {len(history)} history message(s), {used} of {budget} history tokens")
+        return summary, trimmed
+
+
+token_counter = TokenCounter(tokenizer_path=LLM_TOKENIZER_PATH, chars_per_token=LLM_CHARS_PER_TOKEN)
+context_budget = ContextBudget(
+    counter=token_counter,
+    total=LLM_PROMPT_TOKEN_BUDGET,
+    system=CONTEXT_BUDGET_SYSTEM,
+    summary=CONTEXT_BUDGET_SUMMARY,
+    history=CONTEXT_BUDGET_HISTORY,
+    user_message=CONTEXT_BUDGET_USER_MESSAGE,
+)
+
+__all__ = ["token_counter", "context_budget", "TokenCounter", "ContextBudget"]